@@ -8,9 +8,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import time
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'number_verification.settings')
 
+started = time.perf_counter()
 application = get_asgi_application()
+
+from user import warmup  # noqa: E402
+
+warmup.application_loaded(time.perf_counter() - started)
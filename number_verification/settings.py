@@ -13,6 +13,8 @@ import os
 
 from pathlib import Path
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
+
 load_dotenv(override=True)
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -26,7 +28,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-d4u4_o*8y*hr-sy8134iefu)la$23%oei=@tvnk*vv5=ck8nq0'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv("DEBUG", "true").lower() in ("1", "true", "yes")
 
 ALLOWED_HOSTS = []
 
@@ -47,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'user.middleware.InstrumentationMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,13 +66,21 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compile each template once per process. This is what Django
+            # does by default; it is spelled out so that it survives any
+            # change to the loaders. runserver still picks up edits.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -79,22 +91,82 @@ WSGI_APPLICATION = 'number_verification.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.mysql",
-        "NAME": os.getenv("DB_NAME"),
-        "USER": os.getenv("DB_USER"),
-        "PASSWORD": os.getenv("DB_PASS"),
-        "HOST": "localhost",
-        "PORT": "3306",
-        "OPTIONS": {
-            "init_command": "SET sql_mode='STRICT_TRANS_TABLES'",
-            "charset": "utf8mb4",
-        },
+# Connections are kept open for DB_CONN_MAX_AGE seconds ("none" for no limit,
+# 0 to close them after every request) and checked before being reused. Each
+# worker thread keeps its own, so this pools one connection per thread. Under
+# ASGI, set DB_CONN_MAX_AGE=0 as Django recommends: async views hand their
+# queries to worker threads, whose connections are not reliably closed.
+DB_CONN_MAX_AGE = os.getenv("DB_CONN_MAX_AGE", "60")
+
+if os.getenv("DB_ENGINE", "mysql") == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / os.getenv("DB_NAME", "db.sqlite3"),
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.mysql",
+            "NAME": os.getenv("DB_NAME"),
+            "USER": os.getenv("DB_USER"),
+            "PASSWORD": os.getenv("DB_PASS"),
+            "HOST": os.getenv("DB_HOST", "localhost"),
+            "PORT": os.getenv("DB_PORT", "3306"),
+            "OPTIONS": {
+                "init_command": "SET sql_mode='STRICT_TRANS_TABLES'",
+                "charset": "utf8mb4",
+            },
+        }
     }
+DATABASES["default"]["CONN_MAX_AGE"] = None if DB_CONN_MAX_AGE.lower() == "none" else int(DB_CONN_MAX_AGE)
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
+# A read replica of the primary, on DB_REPLICA_HOST (MySQL) or in the
+# DB_REPLICA_NAME file (SQLite). Tests read it through the primary's test
+# database.
+if os.getenv("DB_REPLICA_HOST") or os.getenv("DB_REPLICA_NAME"):
+    DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+    if os.getenv("DB_REPLICA_HOST"):
+        DATABASES["replica"]["HOST"] = os.getenv("DB_REPLICA_HOST")
+    if os.getenv("DB_REPLICA_NAME"):
+        DATABASES["replica"]["NAME"] = (
+            BASE_DIR / os.getenv("DB_REPLICA_NAME")
+            if DATABASES["default"]["ENGINE"].endswith("sqlite3") else os.getenv("DB_REPLICA_NAME")
+        )
+
+DATABASE_ROUTERS = ["user.routers.PrimaryReplicaRouter"]
+
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) in production so
+# that every worker sees the same invalidations.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    },
+    "sessions": {
+        "BACKEND": os.getenv("SESSION_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("SESSION_CACHE_LOCATION", "sessions"),
+    },
 }
 
+# Sessions
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/
+# The pages keep the user's JWTs in the session. SESSION_BACKEND picks where:
+# "cached_db" (default) reads the session table only on a cache miss, "cache"
+# never touches it (use a shared or file-based SESSION_CACHE_BACKEND so every
+# worker sees the sessions), "signed_cookies" keeps the session in the
+# browser, and "db" is Django's default.
 
+SESSION_ENGINE = f"django.contrib.sessions.backends.{os.getenv('SESSION_BACKEND', 'cached_db')}"
+SESSION_CACHE_ALIAS = "sessions"
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -147,8 +219,112 @@ REST_FRAMEWORK = {
     ],
 
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.ArmstrongJWTAuthentication",
+    ),
+
+    "DEFAULT_RENDERER_CLASSES": (
+        "user.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
     ),
 }
 
+# Directory where Armstrong tables that had to be searched for (when the
+# bundled ones no longer match TABLE_SEARCH_BUDGET, see user/armstrong.py) are
+# cached between worker restarts. Leave unset to keep them in memory only.
+ARMSTRONG_TABLE_CACHE_DIR = os.getenv("ARMSTRONG_TABLE_CACHE_DIR")
+
+# Build what the first requests would otherwise wait for (URL resolver,
+# password validators, templates, Armstrong tables...) when a worker starts,
+# before it serves traffic (see user/warmup.py).
+ARMSTRONG_WARMUP = os.getenv("ARMSTRONG_WARMUP", "").lower() in ("1", "true", "yes")
+
+# Addresses and networks (comma-separated, e.g. "127.0.0.1,10.0.0.0/8") that
+# may read /metrics/; everyone else gets 403. Behind a proxy every request
+# comes from the proxy, so have it deny /metrics/ to the outside instead.
+ARMSTRONG_METRICS_ALLOWED_IPS = [
+    network.strip()
+    for network in os.getenv("ARMSTRONG_METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+    if network.strip()
+]
 
+# Number of users per page (and per database chunk when streaming) returned by
+# /api/global-armstrong-numbers/.
+ARMSTRONG_GLOBAL_PAGE_SIZE = 100
+
+# Number of saves per page returned by /api/get-numbers/.
+ARMSTRONG_USER_PAGE_SIZE = 100
+
+# Seconds a cached page of the global listing is kept. Entries are versioned
+# and invalidated on every save, so this only bounds memory use.
+ARMSTRONG_GLOBAL_CACHE_TIMEOUT = 3600
+
+# Keep at most one row per (user, number, base): repeated saves are absorbed
+# instead of stored again. Decide before running the first migrate, since the
+# unique constraint is only created when this is on.
+ARMSTRONG_UNIQUE_SAVES = os.getenv("ARMSTRONG_UNIQUE_SAVES", "").lower() in ("1", "true", "yes")
+
+# Write-behind saving: queue saves in memory and write them from a background
+# thread in batches of ARMSTRONG_WRITE_BEHIND_BATCH_SIZE rows or every
+# ARMSTRONG_WRITE_BEHIND_FLUSH_MS milliseconds. When the queue holds
+# ARMSTRONG_WRITE_BEHIND_MAX_QUEUE rows, saves wait up to
+# ARMSTRONG_WRITE_BEHIND_PUT_TIMEOUT seconds and then fail with 503. A batch
+# that fails to be written is retried, waiting twice as long each time, up to
+# ARMSTRONG_WRITE_BEHIND_MAX_RETRIES times before it is dropped and logged.
+ARMSTRONG_WRITE_BEHIND = os.getenv("ARMSTRONG_WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+ARMSTRONG_WRITE_BEHIND_BATCH_SIZE = 500
+ARMSTRONG_WRITE_BEHIND_FLUSH_MS = 200
+ARMSTRONG_WRITE_BEHIND_MAX_QUEUE = 10000
+ARMSTRONG_WRITE_BEHIND_PUT_TIMEOUT = 1.0
+ARMSTRONG_WRITE_BEHIND_MAX_RETRIES = 8
+
+# Authenticate API requests from the access token's claims (id, email,
+# is_active) without loading the user from the database. A deactivated user
+# keeps access until their access token expires.
+ARMSTRONG_STATELESS_AUTH = os.getenv("ARMSTRONG_STATELESS_AUTH", "").lower() in ("1", "true", "yes")
+
+# Seconds to cache user rows loaded for authentication when
+# ARMSTRONG_STATELESS_AUTH is off (0 disables the cache). Cached users are
+# dropped when they are saved or deleted.
+ARMSTRONG_USER_CACHE_TIMEOUT = int(os.getenv("ARMSTRONG_USER_CACHE_TIMEOUT", "0"))
+
+# Cache the whole landing page for visitors without a session, until the next
+# save. The per-user blocks of the page are cached either way.
+ARMSTRONG_PAGE_CACHE = os.getenv("ARMSTRONG_PAGE_CACHE", "").lower() in ("1", "true", "yes")
+
+# Serve the verify, list and global endpoints and pages from the async views
+# in user/async_views.py. Turn on when running under ASGI (uvicorn, daphne);
+# under WSGI each async view would need its own event loop per request.
+ARMSTRONG_ASYNC_VIEWS = os.getenv("ARMSTRONG_ASYNC_VIEWS", "").lower() in ("1", "true", "yes")
+
+# Database alias the read-only listings read from (see user/routers.py);
+# empty to read everything from the primary. After a write, the listings it
+# changed read the primary for ARMSTRONG_READ_AFTER_WRITE_SECONDS, to cover
+# replication lag.
+ARMSTRONG_READ_REPLICA = "replica" if "replica" in DATABASES else ""
+# The global listing's version (which keys its cached pages and fragments and
+# makes its ETag), the pins that send reads to the primary after a write and
+# the cached users live in the default cache, so every worker has to share
+# it. With a cache per process, a save only bumps the version of the worker
+# that made it: the others keep serving, or answering 304 for, the old
+# listing, and read the lagging replica. Only a single DEBUG process may do
+# without a shared cache.
+if (ARMSTRONG_READ_REPLICA or not DEBUG) and CACHES["default"]["BACKEND"].endswith((".LocMemCache", ".DummyCache")):
+    raise ImproperlyConfigured(
+        "Workers need a shared cache outside DEBUG or with a read replica: set CACHE_BACKEND and CACHE_LOCATION."
+    )
+ARMSTRONG_READ_AFTER_WRITE_SECONDS = int(os.getenv("ARMSTRONG_READ_AFTER_WRITE_SECONDS", "5"))
+
+# Live feed at /api/armstrong-numbers/stream/ (ASGI only, see user/live.py).
+# The broker keeps the last ARMSTRONG_LIVE_REPLAY_SIZE events for clients
+# that reconnect; a stream that falls ARMSTRONG_LIVE_QUEUE_SIZE events behind
+# is closed so that its client reconnects and catches up. Idle streams get a
+# keep-alive comment every ARMSTRONG_LIVE_HEARTBEAT_SECONDS.
+ARMSTRONG_LIVE_BROKER = "user.live.LocalBroker"
+ARMSTRONG_LIVE_REPLAY_SIZE = 1000
+ARMSTRONG_LIVE_QUEUE_SIZE = 100
+ARMSTRONG_LIVE_HEARTBEAT_SECONDS = 15
+
+# Saves older than this many days are folded into per-user, per-number daily
+# rollups by `manage.py rollup_numbers` (see user/rollups.py), which the
+# listings read along with the saves kept.
+ARMSTRONG_RETENTION_DAYS = int(os.getenv("ARMSTRONG_RETENTION_DAYS", "90"))
@@ -8,9 +8,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 """
 
 import os
+import time
 
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'number_verification.settings')
 
+started = time.perf_counter()
 application = get_wsgi_application()
+
+from user import warmup  # noqa: E402
+
+warmup.application_loaded(time.perf_counter() - started)
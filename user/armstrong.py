@@ -0,0 +1,315 @@
+"""
+Armstrong (narcissistic) number lookups.
+
+Base 10 has a finite set of Armstrong numbers, the largest of which has 39
+digits, so verification is a single membership test against a precomputed
+table instead of a digit-power sum per request.
+
+The table can be regenerated with the combinatorial search in
+``armstrong_numbers_of_length`` (see ``manage.py generate_armstrong_table``).
+
+The tables of the other bases (2 to 36) are built by the same search and
+ship in ``armstrong_tables.json`` (regenerate it with ``manage.py
+generate_armstrong_table --bundle``), so no request waits for a search. If
+``TABLE_SEARCH_BUDGET`` changes, a base whose bundled table no longer matches
+is searched on first use, and the result kept on disk when
+``ARMSTRONG_TABLE_CACHE_DIR`` is set. Every base's table stays in memory once
+loaded; together they hold under 1,500 numbers.
+"""
+import json
+import os
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from itertools import repeat
+from math import comb
+from typing import NamedTuple
+
+from django.conf import settings
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+DIGIT_VALUES = {ch: value for value, ch in enumerate(DIGITS)}
+MIN_BASE = 2
+MAX_BASE = len(DIGITS)
+
+# How many per-base tables to keep in memory: all of them.
+TABLE_CACHE_SIZE = MAX_BASE - MIN_BASE + 1
+
+BUNDLED_TABLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "armstrong_tables.json")
+
+# Bases whose full search space is too large are only enumerated up to the
+# longest digit length with at most this many digit multisets. Longer numbers
+# are checked directly, which costs one pass over their digits.
+TABLE_SEARCH_BUDGET = 500_000
+
+# Every base-10 Armstrong number (OEIS A005188), plus 0 which the API has
+# always accepted. The list is exhaustive: no number with more than 39 digits
+# can equal the sum of its digits raised to the digit count.
+ARMSTRONG_NUMBERS = frozenset({
+    0, 1, 2, 3, 4, 5, 6, 7, 8, 9,
+    153, 370, 371, 407,
+    1634, 8208, 9474,
+    54748, 92727, 93084,
+    548834,
+    1741725, 4210818, 9800817, 9926315,
+    24678050, 24678051, 88593477,
+    146511208, 472335975, 534494836, 912985153,
+    4679307774,
+    32164049650, 32164049651, 40028394225, 42678290603,
+    44708635679, 49388550606, 82693916578, 94204591914,
+    28116440335967,
+    4338281769391370, 4338281769391371,
+    21897142587612075, 35641594208964132, 35875699062250035,
+    1517841543307505039, 3289582984443187032,
+    4498128791164624869, 4929273885928088826,
+    63105425988599693916,
+    128468643043731391252, 449177399146038697307,
+    21887696841122916288858, 27879694893054074471405, 27907865009977052567814,
+    28361281321319229463398, 35452590104031691935943,
+    174088005938065293023722, 188451485447897896036875, 239313664430041569350093,
+    1550475334214501539088894, 1553242162893771850669378,
+    3706907995955475988644380, 3706907995955475988644381,
+    4422095118095899619457938,
+    121204998563613372405438066, 121270696006801314328439376,
+    128851796696487777842012787, 174650464499531377631639254,
+    177265453171792792366489765,
+    14607640612971980372614873089, 19008174136254279995012734740,
+    19008174136254279995012734741, 23866716435523975980390369295,
+    1145037275765491025924292050346, 1927890457142960697580636236639,
+    2309092682616190307509695338915,
+    17333509997782249308725103962772,
+    186709961001538790100634132976990, 186709961001538790100634132976991,
+    1122763285329372541592822900204593,
+    12639369517103790328947807201478392, 12679937780272278566303885594196922,
+    1219167219625434121569735803609966019,
+    12815792078366059955099770545296129367,
+    115132219018763992565095597973971522400,
+    115132219018763992565095597973971522401,
+})
+
+ARMSTRONG_NUMBERS_SORTED = tuple(sorted(ARMSTRONG_NUMBERS))
+
+
+class ArmstrongTable(NamedTuple):
+    """The Armstrong numbers of one base with at most ``length`` digits."""
+
+    base: int
+    length: int
+    numbers: frozenset
+
+    @property
+    def limit(self) -> int:
+        """Numbers below this are fully covered by the table."""
+        return self.base ** self.length
+
+
+def to_base(num: int, base: int = 10) -> str:
+    """Return the digits of ``num`` written in ``base``."""
+    if base == 10:
+        return str(num)
+    if num == 0:
+        return "0"
+    digits = []
+    while num:
+        num, remainder = divmod(num, base)
+        digits.append(DIGITS[remainder])
+    return "".join(reversed(digits))
+
+
+@lru_cache(maxsize=None)
+def max_length(base: int = 10) -> int:
+    """Return the largest digit count an Armstrong number in ``base`` could possibly have."""
+    length = 1
+    while length * (base - 1) ** length >= base ** (length - 1):
+        length += 1
+    return length - 1
+
+
+ARMSTRONG_MAX_LENGTH = max_length(10)
+
+
+def is_armstrong(num: int, base: int = 10) -> bool:
+    """Check if a number is an Armstrong number."""
+    if base == 10:
+        return num in ARMSTRONG_NUMBERS
+    table = armstrong_table(base)
+    if num < table.limit:
+        return num in table.numbers
+    if num >= armstrong_bound(base):
+        return False
+    return is_armstrong_reference(num, base)
+
+
+@lru_cache(maxsize=None)
+def armstrong_bound(base: int) -> int:
+    """Return a number larger than every Armstrong number in ``base``."""
+    return base ** max_length(base)
+
+
+def is_armstrong_reference(num: int, base: int = 10) -> bool:
+    """Check if a number is an Armstrong number by summing its digit powers.
+
+    Kept as the reference implementation the lookup tables are tested against,
+    and used for numbers longer than a partial table covers.
+    """
+    digits = to_base(num, base)
+    power = len(digits)
+    return sum(DIGIT_VALUES[d] ** power for d in digits) == num
+
+
+def armstrong_numbers_between(lo: int, hi: int) -> tuple:
+    """Return the Armstrong numbers in [lo, hi] in ascending order."""
+    start = bisect_left(ARMSTRONG_NUMBERS_SORTED, lo)
+    end = bisect_right(ARMSTRONG_NUMBERS_SORTED, hi)
+    return ARMSTRONG_NUMBERS_SORTED[start:end]
+
+
+def armstrong_numbers_of_length(length: int, lo: int = None, hi: int = None, base: int = 10) -> list:
+    """Find every Armstrong number with ``length`` digits, optionally within [lo, hi].
+
+    Instead of testing every integer, this walks the non-decreasing digit
+    multisets (choosing how many 9s, then 8s, ... then 0s) and checks whether
+    the digit-power sum of a multiset is made of exactly those digits. A
+    branch is pruned when its reachable sums fall outside the range, or when
+    the leading digits all those sums share contradict the digits already
+    chosen.
+    """
+    powers = [d ** length for d in range(base)]
+    lower = base ** (length - 1) if length > 1 else 0
+    upper = base ** length - 1
+    if lo is not None:
+        lower = max(lower, lo)
+    if hi is not None:
+        upper = min(upper, hi)
+    if lower > upper:
+        return []
+
+    counts = [0] * base
+    found = []
+
+    def search(digit, remaining, total):
+        high = total + remaining * powers[digit]
+        if high < lower or total > upper:
+            return
+
+        if digit == 0:
+            counts[0] = remaining
+            if total >= lower:
+                digits = to_base(total, base)
+                if len(digits) == length and all(digits.count(DIGITS[d]) == counts[d] for d in range(base)):
+                    found.append(total)
+            return
+
+        # Every reachable sum starts with ``prefix``, so the final number must
+        # contain those digits: bigger digits are already fixed, smaller ones
+        # have to fit in the remaining slots.
+        low_str, high_str = to_base(max(total, lower), base), to_base(min(high, upper), base)
+        if len(low_str) == len(high_str):
+            k = 0
+            while k < len(low_str) and low_str[k] == high_str[k]:
+                k += 1
+            prefix = low_str[:k]
+            unfixed = 0
+            for ch in prefix:
+                d = DIGIT_VALUES[ch]
+                if d > digit:
+                    if prefix.count(ch) > counts[d]:
+                        return
+                else:
+                    unfixed += 1
+            if unfixed > remaining:
+                return
+
+        for count in range(remaining, -1, -1):
+            counts[digit] = count
+            search(digit - 1, remaining - count, total + count * powers[digit])
+        counts[digit] = 0
+
+    search(base - 1, length, 0)
+    return sorted(found)
+
+
+def search_armstrong_numbers(lo: int, hi: int, workers: int = None, base: int = 10):
+    """Yield the Armstrong numbers in [lo, hi] in ascending order by combinatorial search.
+
+    Each digit length is searched independently, so lengths are spread over a
+    process pool when ``workers`` is not 1. Results are yielded as soon as the
+    length they belong to has been searched.
+    """
+    lo = max(lo, 0)
+    hi = min(hi, base ** max_length(base) - 1)
+    if lo > hi:
+        return
+    lengths = range(len(to_base(lo, base)), len(to_base(hi, base)) + 1)
+
+    if workers == 1 or len(lengths) == 1:
+        for length in lengths:
+            yield from armstrong_numbers_of_length(length, lo, hi, base)
+        return
+
+    # Imported here: the pool is only used by this offline search, and the
+    # API workers would otherwise pay for importing it at startup.
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for numbers in executor.map(armstrong_numbers_of_length, lengths, repeat(lo), repeat(hi), repeat(base)):
+            yield from numbers
+
+
+def table_length(base: int) -> int:
+    """Return how many digits the lazily built table for ``base`` covers."""
+    length = 0
+    while length < max_length(base) and comb(length + base, base - 1) <= TABLE_SEARCH_BUDGET:
+        length += 1
+    return length
+
+
+@lru_cache(maxsize=None)
+def bundled_tables() -> dict:
+    """Return the tables shipped in ``armstrong_tables.json`` as ``{base: ArmstrongTable}``."""
+    try:
+        with open(BUNDLED_TABLES_PATH) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {
+        int(base): ArmstrongTable(int(base), table["length"], frozenset(table["numbers"]))
+        for base, table in data.items()
+    }
+
+
+@lru_cache(maxsize=TABLE_CACHE_SIZE)
+def armstrong_table(base: int) -> ArmstrongTable:
+    """Return the Armstrong table for ``base``, from the bundled tables or built on first use."""
+    if not MIN_BASE <= base <= MAX_BASE:
+        raise ValueError(f"base must be between {MIN_BASE} and {MAX_BASE}")
+    if base == 10:
+        return ArmstrongTable(10, ARMSTRONG_MAX_LENGTH, ARMSTRONG_NUMBERS)
+
+    length = table_length(base)
+    bundled = bundled_tables().get(base)
+    if bundled is not None and bundled.length == length:
+        return bundled
+    return build_table(base, length)
+
+
+def build_table(base: int, length: int) -> ArmstrongTable:
+    """Search ``base`` for Armstrong numbers of up to ``length`` digits, using ``ARMSTRONG_TABLE_CACHE_DIR``."""
+    cache_dir = getattr(settings, "ARMSTRONG_TABLE_CACHE_DIR", None)
+    path = os.path.join(cache_dir, f"armstrong-base{base}-len{length}.json") if cache_dir else None
+
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return ArmstrongTable(base, length, frozenset(json.load(f)))
+
+    numbers = list(search_armstrong_numbers(0, base ** length - 1, workers=1, base=base))
+
+    if path:
+        import tempfile
+
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(numbers, f)
+        os.replace(tmp_path, path)
+
+    return ArmstrongTable(base, length, frozenset(numbers))
@@ -0,0 +1,24 @@
+"""
+The URLs of ``user.urls``, with the verify, list and global routes served by
+the async views in ``user.async_views``, plus the live feed, which needs
+ASGI. Used when ``ARMSTRONG_ASYNC_VIEWS`` is on.
+"""
+from django.urls import path
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    "verify_number_api": async_views.verify_number_api,
+    "get_numbers_api": async_views.verify_number_api,
+    "global_armstrong_numbers_api": async_views.global_armstrong_numbers_api,
+    "verify_number": async_views.verify_number,
+    "global_page": async_views.global_page,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name) if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in sync_urlpatterns
+] + [
+    path("api/armstrong-numbers/stream/", async_views.armstrong_numbers_stream, name="armstrong_numbers_stream"),
+]
@@ -0,0 +1,212 @@
+"""
+Async versions of the read/verify endpoints and pages, for ASGI deployments.
+
+They take the same parameters and return the same bodies as their
+counterparts in ``user.views`` but await the ORM instead of blocking a thread
+on it, so one uvicorn or daphne worker can keep many slow clients open at
+once. ``user.async_urls`` routes to them; set ``ARMSTRONG_ASYNC_VIEWS`` to use
+those routes. Registration and login stay sync: they spend their time hashing
+passwords, which would only block the event loop.
+"""
+import json
+
+from django.conf import settings
+from django.contrib import messages
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
+from rest_framework import serializers, status
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import leaderboard, live, metrics, services
+from .forms import NumberForm
+from .renderers import andjson_lines, dumps
+from .serializers import CursorPaginationSerializer, UserNumbersQuerySerializer
+from .views import _anonymous, _global_context, _timestamp, _with_validators
+from .write_behind import SaveBufferFull
+
+
+# -------------------------------------------------------------------------------------------------------------------------
+# API Views
+# -------------------------------------------------------------------------------------------------------------------------
+def _json(data, status=status.HTTP_200_OK):
+    with metrics.serialization():
+        content = dumps(data)
+    return HttpResponse(content, status=status, content_type="application/json")
+
+
+def _request_data(request):
+    """Return the parsed JSON or form body of ``request``."""
+    if request.content_type == "application/json":
+        return json.loads(request.body or b"{}")
+    return request.POST.dict()
+
+
+async def _authenticate(request):
+    """Return the user for the request's ``Authorization: Bearer`` header, or None."""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    return await services.auser_for_access_token(raw_token)
+
+
+def _not_authenticated():
+    response = _json({"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED)
+    response["WWW-Authenticate"] = 'Bearer realm="api"'
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+async def verify_number_api(request):
+    """Verify (and optionally save) a number, or list the user's saved numbers."""
+    user = await _authenticate(request)
+    if user is None:
+        return _not_authenticated()
+
+    if request.method == "POST":
+        try:
+            data = _request_data(request)
+        except ValueError:
+            return _json({"detail": "JSON parse error."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            response_data = await services.averify_number(user, data)
+        except serializers.ValidationError as e:
+            return _json({"is_armstrong": False, "errors": e.detail}, status=status.HTTP_400_BAD_REQUEST)
+        except SaveBufferFull as e:
+            return _json({"detail": e.detail}, status=e.status_code)
+        return _json(response_data)
+
+    serializer = UserNumbersQuerySerializer(data=request.GET)
+    if not serializer.is_valid():
+        return _json({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    etag, last_modified = await services.auser_numbers_validators(user)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=_timestamp(last_modified))
+    if not_modified is not None:
+        return not_modified
+
+    data = await services.auser_numbers(user, **serializer.validated_data)
+    return _with_validators(_json(data), etag, last_modified)
+
+
+@require_GET
+async def global_armstrong_numbers_api(request):
+    serializer = CursorPaginationSerializer(data=request.GET)
+    if not serializer.is_valid():
+        return _json({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+    params = serializer.validated_data
+
+    if params["stream"]:
+        users = services.aiter_global_numbers(chunk_size=params.get("page_size"))
+        return StreamingHttpResponse(andjson_lines(users), content_type="application/x-ndjson")
+
+    etag = await leaderboard.aglobal_etag()
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    data = await services.aglobal_numbers(cursor=params.get("cursor"), page_size=params.get("page_size"))
+    return _with_validators(_json(data), etag)
+
+
+@require_GET
+async def armstrong_numbers_stream(request):
+    """Push each newly saved number as a Server-Sent Event.
+
+    EventSource clients resume from the ``Last-Event-ID`` header they send
+    when reconnecting; others can pass ``?last_event_id=``.
+    """
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    response = StreamingHttpResponse(live.sse_events(last_event_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    # GZipMiddleware leaves responses that have an encoding alone. Compressed,
+    # events would sit in the compressor instead of reaching the client.
+    response["Content-Encoding"] = "identity"
+    return response
+
+
+# -------------------------------------------------------------------------------------------------------------------------
+# Normal Views
+# -------------------------------------------------------------------------------------------------------------------------
+
+async def _session_user(request):
+    """Async version of ``views._session_user``."""
+    # Load the session asynchronously; later sync reads (messages) use the cached copy.
+    access = await request.session.aget("access")
+    user = await services.auser_for_access_token(access) if access else None
+    refresh = await request.session.aget("refresh")
+    if user is None and refresh:
+        access = services.refresh_access_token(refresh)
+        if access:
+            await request.session.aset("access", access)
+            user = await services.auser_for_access_token(access)
+    return user
+
+
+async def verify_number(request):
+    user = await _session_user(request)
+    if user is None:
+        messages.error(request, "⚠️ Please login first")
+        return redirect("login")
+
+    result = None
+    form = NumberForm(request.POST or None)
+
+    if request.method == "POST" and form.is_valid():
+        action = request.POST.get("action")  # detect which button was clicked
+
+        payload = form.cleaned_data
+        if action == "save":  # only add save flag when "Save Number" is clicked
+            payload["save"] = True
+
+        try:
+            result = await services.averify_number(user, payload)
+        except serializers.ValidationError:
+            result = {"message": "❌ Number is not an Armstrong number"}
+        except SaveBufferFull as e:
+            result = {"message": f"⚠️ {e.detail}"}
+        else:
+            if result.get("saved"):
+                messages.success(request, "✅ Number verified and saved!")
+            else:
+                messages.info(request, "ℹ️ Number verified (not saved).")
+
+    user_numbers = await services.auser_numbers(user)
+
+    return render(
+        request,
+        "user/verify_number.html",
+        {"form": form, "result": result, "user_numbers": user_numbers},
+    )
+
+
+async def global_page(request):
+    etag = await leaderboard.aglobal_etag()
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    serializer = CursorPaginationSerializer(data=request.GET)
+    cursor = serializer.validated_data.get("cursor") if serializer.is_valid() else None
+
+    async def build():
+        data = await services.aglobal_numbers(cursor=cursor)
+        return render_to_string("user/global.html", _global_context(data), request)
+
+    if settings.ARMSTRONG_PAGE_CACHE and _anonymous(request):
+        html = await leaderboard.acached_global(f"html:{cursor}", build)
+    else:
+        html = await build()
+    return _with_validators(HttpResponse(html), etag)
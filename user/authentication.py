@@ -0,0 +1,112 @@
+"""
+JWT authentication for the API and the pages.
+
+Access tokens carry the user's ``email`` and ``is_active`` next to the user
+id. With ``ARMSTRONG_STATELESS_AUTH`` on, ``request.user`` is a ``ClaimsUser``
+built from those claims and authentication runs no query at all; a user who
+is deactivated keeps access until their token expires. Otherwise the
+``CustomUser`` row is loaded, and kept for ``ARMSTRONG_USER_CACHE_TIMEOUT``
+seconds when that is set. Cached users are dropped whenever they are saved or
+deleted.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from user.models import CustomUser
+
+USER_CACHE_KEY = "armstrong:user:{}"
+
+
+class ClaimsUser(TokenUser):
+    """A user backed by access token claims instead of a database row."""
+
+    @cached_property
+    def email(self):
+        return self.token.get("email", "")
+
+    @cached_property
+    def is_active(self):
+        return self.token.get("is_active", True)
+
+
+def tokens_for_user(user):
+    """Return a refresh token for ``user`` whose access tokens carry the claims ``ClaimsUser`` reads."""
+    refresh = RefreshToken.for_user(user)
+    refresh["email"] = user.email
+    refresh["is_active"] = user.is_active
+    return refresh
+
+
+def cached_user(user_id):
+    """Return the ``CustomUser`` with ``user_id``, from the user cache when it is enabled."""
+    timeout = settings.ARMSTRONG_USER_CACHE_TIMEOUT
+    user = cache.get(USER_CACHE_KEY.format(user_id)) if timeout else None
+    if user is None:
+        user = CustomUser.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        if timeout:
+            cache.set(USER_CACHE_KEY.format(user_id), user, timeout=timeout)
+    return user
+
+
+async def acached_user(user_id):
+    """Async version of ``cached_user``."""
+    timeout = settings.ARMSTRONG_USER_CACHE_TIMEOUT
+    user = await cache.aget(USER_CACHE_KEY.format(user_id)) if timeout else None
+    if user is None:
+        user = await CustomUser.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        if timeout:
+            await cache.aset(USER_CACHE_KEY.format(user_id), user, timeout=timeout)
+    return user
+
+
+def forget_user(user_id):
+    """Drop ``user_id`` from the user cache."""
+    cache.delete(USER_CACHE_KEY.format(user_id))
+
+
+def full_user(user):
+    """Return the ``CustomUser`` behind ``user``, for views that need more than the claims."""
+    if isinstance(user, CustomUser):
+        return user
+    return cached_user(user.pk)
+
+
+class ArmstrongJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = self._user_id(validated_token)
+        if settings.ARMSTRONG_STATELESS_AUTH:
+            return self._active(ClaimsUser(validated_token))
+        try:
+            user = cached_user(user_id)
+        except CustomUser.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        return self._active(user)
+
+    async def aget_user(self, validated_token):
+        """Async version of ``get_user``."""
+        user_id = self._user_id(validated_token)
+        if settings.ARMSTRONG_STATELESS_AUTH:
+            return self._active(ClaimsUser(validated_token))
+        try:
+            user = await acached_user(user_id)
+        except CustomUser.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        return self._active(user)
+
+    def _user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def _active(self, user):
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,172 @@
+"""
+Microbenchmarks, run with ``manage.py benchmark <suite>``.
+
+Each suite returns a list of result rows: a label, the number of items timed
+and the best time per item over a few repeats. Nothing here touches the
+database.
+"""
+import json
+import random
+import timeit
+from datetime import datetime, timezone
+
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from user.armstrong import ARMSTRONG_NUMBERS_SORTED, is_armstrong, is_armstrong_reference
+from user.models import ArmstrongNumber, CustomUser
+from user.properties import PROPERTIES, classify
+from user.renderers import FastJSONRenderer, orjson
+from user.serializers import ArmstrongSerializer
+
+REPEATS = 5
+
+
+def measure(label, func, items, repeats=REPEATS):
+    """Time ``func()``, which handles ``items`` items, and return the best run per item."""
+    best = min(timeit.repeat(func, number=1, repeat=repeats))
+    return {"label": label, "items": items, "seconds_per_item": best / items}
+
+
+# -------------------------------------------------------------------------------------------------------------------------
+# Armstrong checks by digit length
+# -------------------------------------------------------------------------------------------------------------------------
+def _numbers_of_length(length, samples):
+    """Return ``samples`` numbers with ``length`` digits, starting with the Armstrong ones."""
+    lo, hi = (0 if length == 1 else 10 ** (length - 1)), 10 ** length
+    numbers = [number for number in ARMSTRONG_NUMBERS_SORTED if lo <= number < hi][:samples]
+    rng = random.Random(length)
+    numbers += [rng.randrange(lo, hi) for _ in range(samples - len(numbers))]
+    return numbers
+
+
+def armstrong(samples=200, lengths=range(1, len(str(ARMSTRONG_NUMBERS_SORTED[-1])) + 1)):
+    """Time ``is_armstrong``, the digit-power reference and serializer validation per digit length.
+
+    Lengths run up to that of the largest Armstrong number (39 digits). The
+    Armstrong numbers of each length are mixed in with random ones.
+    """
+    results = []
+    for length in lengths:
+        numbers = _numbers_of_length(length, samples)
+        results.append(measure(
+            f"is_armstrong, {length} digits",
+            lambda numbers=numbers: [is_armstrong(number) for number in numbers],
+            samples,
+        ))
+        results.append(measure(
+            f"is_armstrong_reference, {length} digits",
+            lambda numbers=numbers: [is_armstrong_reference(number) for number in numbers],
+            samples,
+        ))
+        results.append(measure(
+            f"ArmstrongSerializer.is_valid, {length} digits",
+            lambda numbers=numbers: [ArmstrongSerializer(data={"number": number}).is_valid() for number in numbers],
+            samples,
+        ))
+    return results
+
+
+# -------------------------------------------------------------------------------------------------------------------------
+# Digit properties
+# -------------------------------------------------------------------------------------------------------------------------
+def properties(samples=2000, lengths=(3, 10, 20, 39)):
+    """Time each property of ``classify`` alone, then all of them with one digit split and with one split each."""
+    numbers = [number for length in lengths for number in _numbers_of_length(length, samples // len(lengths))]
+    results = [
+        measure(f"classify, {name} only", lambda name=name: [classify(n, properties=(name,)) for n in numbers], len(numbers))
+        for name in PROPERTIES
+    ]
+    results.append(measure(
+        "classify, all properties (one digit split)",
+        lambda: [classify(n) for n in numbers],
+        len(numbers),
+    ))
+    results.append(measure(
+        "classify, all properties (one digit split each)",
+        lambda: [[classify(n, properties=(name,)) for name in PROPERTIES] for n in numbers],
+        len(numbers),
+    ))
+    return results
+
+
+# -------------------------------------------------------------------------------------------------------------------------
+# Serialization of the global listing
+# -------------------------------------------------------------------------------------------------------------------------
+class _LegacyArmstrongSerializer(serializers.Serializer):
+    number = serializers.IntegerField()
+    base = serializers.IntegerField()
+
+
+class _LegacyUserSerializer(serializers.ModelSerializer):
+    """The nested ModelSerializer the global listing used before it switched to values() rows."""
+
+    armstrong_numbers = _LegacyArmstrongSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = CustomUser
+        fields = ["id", "email", "armstrong_numbers"]
+
+
+def _legacy_users(users, numbers_per_user):
+    rows = []
+    for pk in range(1, users + 1):
+        user = CustomUser(id=pk, email=f"user{pk}@example.com")
+        user._prefetched_objects_cache = {
+            "armstrong_numbers": [
+                ArmstrongNumber(id=pk * numbers_per_user + i, user=user, number=153, base=10)
+                for i in range(numbers_per_user)
+            ]
+        }
+        rows.append(user)
+    return rows
+
+
+def _value_rows(users, numbers_per_user):
+    saved_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": pk,
+            "email": f"user{pk}@example.com",
+            "armstrong_summary__count": numbers_per_user,
+            "armstrong_summary__latest_saved_at": saved_at,
+            "armstrong_summary__numbers": [{"number": 153, "base": 10}] * numbers_per_user,
+            "armstrong_summary__updated_at": saved_at,
+        }
+        for pk in range(1, users + 1)
+    ]
+
+
+def serialization(users=2000, numbers_per_user=5):
+    """Compare the nested-serializer listing with the values()-row listing, per user row."""
+    from user.services import _global_user
+
+    legacy = _legacy_users(users, numbers_per_user)
+    values = _value_rows(users, numbers_per_user)
+
+    results = [
+        measure(
+            "nested ModelSerializer + JSONRenderer (before)",
+            lambda: JSONRenderer().render({"users": _LegacyUserSerializer(legacy, many=True).data}),
+            users,
+        ),
+        measure(
+            "values() rows + stdlib json",
+            lambda: json.dumps({"users": [_global_user(row) for row in values]}).encode(),
+            users,
+        ),
+    ]
+    if orjson is not None:
+        results.append(measure(
+            "values() rows + FastJSONRenderer/orjson (after)",
+            lambda: FastJSONRenderer().render({"users": [_global_user(row) for row in values]}),
+            users,
+        ))
+    return results
+
+
+SUITES = {
+    "armstrong": armstrong,
+    "properties": properties,
+    "serialization": serialization,
+}
@@ -0,0 +1,247 @@
+"""
+Denormalized per-user summaries behind the global listing.
+
+Each ``ArmstrongNumberSummary`` row holds a user's save count, latest save
+and distinct numbers, kept up to date as numbers are saved or deleted, and
+counting the saves folded into daily rollups (see ``user.rollups``). The
+global listing reads those rows instead of every ``ArmstrongNumber``, and its
+responses are cached under a version number that every write bumps.
+"""
+import threading
+import time
+from collections import defaultdict
+from itertools import chain
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from user import live, routers
+from user.models import MAX_BIG_NUMBER, ArmstrongNumber, ArmstrongNumberRollup, ArmstrongNumberSummary
+
+VERSION_KEY = "armstrong:global:version"
+
+# Summaries written per statement by rebuild().
+SUMMARY_BATCH_SIZE = 500
+
+# Users whose summaries rebuild_on_commit() will rebuild, per thread (and so
+# per database connection).
+_pending_rebuilds = threading.local()
+
+
+def global_version():
+    """Return the current version of the global listing."""
+    # Start from a timestamp rather than 1 so that a version key evicted from
+    # the cache can never be recreated with a number that still has entries.
+    cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+    return cache.get(VERSION_KEY)
+
+
+async def aglobal_version():
+    """Async version of ``global_version``."""
+    await cache.aadd(VERSION_KEY, int(time.time() * 1000), timeout=None)
+    return await cache.aget(VERSION_KEY)
+
+
+def bump_global_version():
+    """Invalidate every cached page of the global listing."""
+    # Rebuild those pages from the primary until the replica has the write.
+    routers.pin_primary(routers.GLOBAL_LISTING)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        global_version()
+
+
+def global_etag():
+    """Return an ETag that changes whenever the global listing does."""
+    return f'W/"global-{global_version()}"'
+
+
+async def aglobal_etag():
+    """Async version of ``global_etag``."""
+    return f'W/"global-{await aglobal_version()}"'
+
+
+def cached_global(key, build):
+    """Return ``build()`` cached under ``key`` for the current listing version."""
+    versioned_key = f"armstrong:global:{global_version()}:{key}"
+    value = cache.get(versioned_key)
+    if value is None:
+        value = build()
+        cache.set(versioned_key, value, timeout=settings.ARMSTRONG_GLOBAL_CACHE_TIMEOUT)
+    return value
+
+
+async def acached_global(key, build):
+    """Async version of ``cached_global``; ``build`` is awaited on a miss."""
+    versioned_key = f"armstrong:global:{await aglobal_version()}:{key}"
+    value = await cache.aget(versioned_key)
+    if value is None:
+        value = await build()
+        await cache.aset(versioned_key, value, timeout=settings.ARMSTRONG_GLOBAL_CACHE_TIMEOUT)
+    return value
+
+
+def _entries(numbers):
+    """Return the distinct (number, base) pairs of ``numbers`` as summary entries.
+
+    Numbers wider than a BIGINT are stored as decimal strings, since JSON
+    columns (MySQL's in particular) would round them to doubles.
+    """
+    return [
+        {"number": number if number <= MAX_BIG_NUMBER else str(number), "base": base}
+        for number, base in sorted(numbers, key=lambda p: (p[1], p[0]))
+    ]
+
+
+def listed_entries(entries):
+    """Return summary ``entries`` with every number as an int again."""
+    if all(type(entry["number"]) is int for entry in entries):
+        return entries
+    return [{"number": int(entry["number"]), "base": entry["base"]} for entry in entries]
+
+
+def record_saves(rows):
+    """Fold newly created ``ArmstrongNumber`` rows into their users' summaries.
+
+    With ``ARMSTRONG_UNIQUE_SAVES`` on, rows whose number the user already had
+    were dropped by the database and are not counted. The counted rows are
+    published to the live feed once the transaction commits, and returned.
+    """
+    by_user = defaultdict(list)
+    for row in rows:
+        by_user[row.user_id].append(row)
+    saved = []
+
+    with transaction.atomic():
+        for user_id, user_rows in by_user.items():
+            summary, _ = ArmstrongNumberSummary.objects.select_for_update().get_or_create(user_id=user_id)
+            known = {(entry["number"], entry["base"]) for entry in listed_entries(summary.numbers)}
+            if settings.ARMSTRONG_UNIQUE_SAVES:
+                unique_rows = {(row.value, row.base): row for row in reversed(user_rows)}
+                user_rows = [row for key, row in unique_rows.items() if key not in known]
+                if not user_rows:
+                    continue
+
+            summary.count += len(user_rows)
+            latest = max(row.created_at for row in user_rows)
+            if summary.latest_saved_at is None or latest > summary.latest_saved_at:
+                summary.latest_saved_at = latest
+            summary.numbers = _entries(known | {(row.value, row.base) for row in user_rows})
+            summary.save()
+            saved.extend(user_rows)
+
+    transaction.on_commit(lambda: routers.pin_primary(*map(routers.user_listing, by_user)))
+    transaction.on_commit(bump_global_version)
+    transaction.on_commit(lambda: live.publish_saves(saved))
+    return saved
+
+
+def rebuild(user_ids=None):
+    """Recompute summaries from ``ArmstrongNumber`` rows and rollups, for some users or all of them.
+
+    Summaries are written with batched upserts. Users given explicitly who
+    have no numbers left only have an existing summary emptied, never a new
+    one created, so that this is safe to call while a user is being deleted.
+    """
+    rows = ArmstrongNumber.objects.order_by()
+    rollups = ArmstrongNumberRollup.objects.order_by()
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    totals = {}
+    for user_id, count, latest_saved_at in chain(
+        rows.values("user_id").annotate(count=Count("id"), latest=Max("created_at")).values_list(
+            "user_id", "count", "latest"
+        ),
+        rollups.values("user_id").annotate(total=Sum("count"), latest=Max("last_saved_at")).values_list(
+            "user_id", "total", "latest"
+        ),
+    ):
+        total = totals.get(user_id)
+        if total is None:
+            totals[user_id] = [count, latest_saved_at]
+        else:
+            total[0] += count
+            total[1] = max(total[1], latest_saved_at)
+    numbers = defaultdict(set)
+    for user_id, number, wide_number, base in chain(
+        rows.values_list("user_id", "number", "wide_number", "base").distinct(),
+        rollups.values_list("user_id", "number", "wide_number", "base").distinct(),
+    ):
+        numbers[user_id].add((number if number is not None else wide_number, base))
+
+    now = timezone.now()
+    summaries = [
+        ArmstrongNumberSummary(
+            user_id=user_id,
+            count=count,
+            latest_saved_at=latest_saved_at,
+            numbers=_entries(numbers[user_id]),
+            updated_at=now,
+        )
+        for user_id, (count, latest_saved_at) in totals.items()
+    ]
+
+    db = router.db_for_write(ArmstrongNumberSummary)
+    with transaction.atomic(using=db):
+        if user_ids is None:
+            ArmstrongNumberSummary.objects.exclude(user_id__in=ArmstrongNumber.objects.values("user_id")).exclude(
+                user_id__in=ArmstrongNumberRollup.objects.values("user_id")
+            ).delete()
+        else:
+            ArmstrongNumberSummary.objects.filter(user_id__in=set(user_ids) - totals.keys()).update(
+                count=0, latest_saved_at=None, numbers=[], updated_at=now,
+            )
+        _upsert(db, summaries)
+
+    if user_ids is not None:
+        transaction.on_commit(lambda: routers.pin_primary(*map(routers.user_listing, user_ids)))
+    transaction.on_commit(bump_global_version)
+
+
+def rebuild_on_commit(user_id):
+    """Rebuild ``user_id``'s summary once the current transaction commits.
+
+    Every user passed during one transaction is rebuilt by a single
+    ``rebuild`` call, so deleting many saves, or a user with many saves,
+    costs one rebuild instead of one per row.
+    """
+    user_ids = getattr(_pending_rebuilds, "user_ids", None)
+    if user_ids is None:
+        user_ids = _pending_rebuilds.user_ids = set()
+    user_ids.add(user_id)
+    # The first callback to run takes the whole set; the others find it empty.
+    # Users left over from a rolled back transaction are rebuilt with the next
+    # ones, which is harmless since a rebuild reads the committed rows.
+    transaction.on_commit(_rebuild_pending)
+
+
+def _rebuild_pending():
+    user_ids = getattr(_pending_rebuilds, "user_ids", None)
+    if user_ids:
+        _pending_rebuilds.user_ids = set()
+        rebuild(user_ids)
+
+
+def touch(user_ids):
+    """Mark the listings of ``user_ids`` as changed by a rewrite of their saves that kept the totals."""
+    ArmstrongNumberSummary.objects.filter(user_id__in=user_ids).update(updated_at=timezone.now())
+    transaction.on_commit(lambda: routers.pin_primary(*map(routers.user_listing, user_ids)))
+    transaction.on_commit(bump_global_version)
+
+
+def _upsert(db, summaries):
+    # MySQL upserts on any unique key and does not accept a conflict target.
+    unique_fields = ["user"] if connections[db].features.supports_update_conflicts_with_target else None
+    ArmstrongNumberSummary.objects.using(db).bulk_create(
+        summaries,
+        batch_size=SUMMARY_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=["count", "latest_saved_at", "numbers", "updated_at"],
+    )
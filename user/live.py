@@ -0,0 +1,156 @@
+"""
+Live feed of newly saved Armstrong numbers, served as Server-Sent Events by
+``async_views.armstrong_numbers_stream``.
+
+Every committed save is published to a broker. The broker fans it out to
+the open streams and keeps the last ``ARMSTRONG_LIVE_REPLAY_SIZE`` events,
+so a client that reconnects with ``Last-Event-ID`` gets what it missed, or a
+``reset`` event when too much happened to replay. ``ARMSTRONG_LIVE_BROKER``
+names the broker class. The default ``LocalBroker`` only sees the saves of
+its own process; with several workers, plug in a broker with the same
+methods that is shared between them (over Redis pub/sub, for example).
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from user.renderers import dumps
+
+
+class Event(NamedTuple):
+    id: int
+    data: dict
+
+
+class Subscription:
+    """The pending events of one stream, delivered from any thread and read on the stream's event loop."""
+
+    def __init__(self, queue_size):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The stream ends once it has sent what it has; the client then
+            # reconnects and catches up from the replay buffer.
+            self.overflowed = True
+
+    async def get(self, timeout):
+        """Return the next event, or None if none arrives within ``timeout`` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """Publishes events to the streams of this process."""
+
+    def __init__(self, replay_size=None, queue_size=None):
+        self.queue_size = queue_size or settings.ARMSTRONG_LIVE_QUEUE_SIZE
+        self._lock = threading.Lock()
+        self._replay = deque(maxlen=replay_size or settings.ARMSTRONG_LIVE_REPLAY_SIZE)
+        self._subscriptions = set()
+        # Start from a timestamp so that ids keep growing across restarts and
+        # an id from before one is never taken for a recent event.
+        self._last_id = int(time.time() * 1000)
+
+    def publish(self, data):
+        with self._lock:
+            self._last_id += 1
+            event = Event(self._last_id, data)
+            self._replay.append(event)
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.deliver(event)
+            except RuntimeError:
+                # Its event loop has closed.
+                self.unsubscribe(subscription)
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """Open a subscription on the running event loop.
+
+        Returns ``(subscription, missed, complete)``: the events after
+        ``last_event_id`` still in the replay buffer, and whether they are
+        all the events the client missed.
+        """
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            if last_event_id is None:
+                return subscription, [], True
+            missed = [event for event in self._replay if event.id > last_event_id]
+            complete = last_event_id == self._last_id or (bool(missed) and missed[0].id == last_event_id + 1)
+        return subscription, missed, complete
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers": len(self._subscriptions), "replay_events": len(self._replay)}
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker(create=True):
+    """Return this process's broker, creating it on first use unless ``create`` is False."""
+    global _broker
+    with _broker_lock:
+        if _broker is None and create:
+            _broker = import_string(settings.ARMSTRONG_LIVE_BROKER)()
+        return _broker
+
+
+def publish_saves(rows):
+    """Publish newly saved ``ArmstrongNumber`` rows to the live feed."""
+    broker = get_broker()
+    for row in rows:
+        broker.publish({
+            "user_id": row.user_id,
+            "number": row.value,
+            "base": row.base,
+            "created_at": row.created_at.isoformat(),
+        })
+
+
+def _sse(event, name, data):
+    lines = [] if event is None else [b"id: %d" % event]
+    lines += [b"event: " + name.encode(), b"data: " + dumps(data)]
+    return b"\n".join(lines) + b"\n\n"
+
+
+async def sse_events(last_event_id=None, heartbeat=None):
+    """Yield the live feed as Server-Sent Events until the client goes away or falls too far behind."""
+    heartbeat = heartbeat or settings.ARMSTRONG_LIVE_HEARTBEAT_SECONDS
+    broker = get_broker()
+    subscription, missed, complete = broker.subscribe(last_event_id)
+    try:
+        yield b"retry: 3000\n\n"
+        if not complete:
+            # Events were lost: the client should reload the full listing.
+            yield _sse(None, "reset", {})
+        for event in missed:
+            yield _sse(event.id, "save", event.data)
+        while not (subscription.overflowed and subscription.queue.empty()):
+            event = await subscription.get(heartbeat)
+            # A comment line keeps proxies from closing an idle connection.
+            yield b": keep-alive\n\n" if event is None else _sse(event.id, "save", event.data)
+    finally:
+        broker.unsubscribe(subscription)
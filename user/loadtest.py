@@ -0,0 +1,155 @@
+"""
+End-to-end load driver, run with ``manage.py loadtest``.
+
+Requests go through the whole Django stack in-process, using the test client
+against the configured database; seed a scratch SQLite database with
+``--seed`` first. Each scenario reports latency percentiles, throughput and
+the SQL queries per request (from the ``Server-Timing`` header), and fails if
+a request ran more queries than its budget in ``QUERY_BUDGETS``.
+"""
+import random
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from user import leaderboard
+from user.armstrong import ARMSTRONG_NUMBERS_SORTED
+from user.authentication import tokens_for_user
+from user.models import ArmstrongNumber, CustomUser
+
+SEED_EMAIL = "load{}@example.com"
+SEED_PASSWORD = "LoadTest123!"
+
+# Most SQL queries one request of each scenario may run. Authentication is
+# included unless ARMSTRONG_STATELESS_AUTH is on.
+QUERY_BUDGETS = {
+    "register": 2,
+    "login": 2,
+    "verify": 1,
+    "verify_save": 6,
+    "list": 4,
+    "global": 2,
+}
+
+AUTHENTICATED_SCENARIOS = ("verify", "verify_save", "list")
+
+_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+_SEED_NUMBERS = [number for number in ARMSTRONG_NUMBERS_SORTED if number > 0]
+
+
+def seed(users, numbers, batch_size=5000, stdout=None):
+    """Create ``users`` users and ``numbers`` saved numbers spread over them, then rebuild the summaries."""
+    rng = random.Random(0)
+    password = make_password(SEED_PASSWORD)
+    first_id = (CustomUser.objects.order_by("-id").values_list("id", flat=True).first() or 0) + 1
+
+    for start in range(0, users, batch_size):
+        CustomUser.objects.bulk_create(
+            [CustomUser(email=SEED_EMAIL.format(i), password=password) for i in range(start, min(start + batch_size, users))],
+            batch_size=batch_size,
+        )
+    user_ids = list(CustomUser.objects.filter(id__gte=first_id).values_list("id", flat=True))
+
+    for start in range(0, numbers, batch_size):
+        with transaction.atomic():
+            ArmstrongNumber.objects.bulk_create(
+                [
+                    ArmstrongNumber(user_id=rng.choice(user_ids), value=rng.choice(_SEED_NUMBERS))
+                    for _ in range(min(batch_size, numbers - start))
+                ],
+                batch_size=batch_size,
+            )
+        if stdout is not None:
+            stdout.write(f"  {start + batch_size:>10} / {numbers} numbers\r", ending="")
+
+    leaderboard.rebuild()
+
+
+def query_budget(scenario):
+    """Return the query budget of ``scenario`` under the current authentication settings."""
+    budget = QUERY_BUDGETS[scenario]
+    if settings.ARMSTRONG_STATELESS_AUTH and scenario in AUTHENTICATED_SCENARIOS:
+        budget -= 1
+    return budget
+
+
+def percentile(ordered, q):
+    """Return the ``q``-th percentile of an ascending list, by nearest rank."""
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class LoadDriver:
+    """Runs the scenarios as one seeded user, through an in-process test client."""
+
+    def __init__(self, email=None, password=SEED_PASSWORD, client=None):
+        # DEBUG allows localhost without listing it in ALLOWED_HOSTS.
+        self.client = client or Client(SERVER_NAME="localhost")
+        self.user = CustomUser.objects.filter(email=email or SEED_EMAIL.format(0)).first()
+        if self.user is None:
+            raise CustomUser.DoesNotExist(f"{email or SEED_EMAIL.format(0)} does not exist; seed the database first.")
+        self.password = password
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {tokens_for_user(self.user).access_token}"}
+
+    def register(self, i):
+        email = f"load-{uuid.uuid4().hex}@example.com"
+        data = {"email": email, "password1": SEED_PASSWORD, "password2": SEED_PASSWORD}
+        return self.client.post(reverse("register_api"), data, content_type="application/json")
+
+    def login(self, i):
+        data = {"email": self.user.email, "password": self.password}
+        return self.client.post(reverse("login_api"), data, content_type="application/json")
+
+    def verify(self, i):
+        data = {"number": _SEED_NUMBERS[i % len(_SEED_NUMBERS)]}
+        return self.client.post(reverse("verify_number_api"), data, content_type="application/json", **self.auth)
+
+    def verify_save(self, i):
+        data = {"number": _SEED_NUMBERS[i % len(_SEED_NUMBERS)], "save": True}
+        return self.client.post(reverse("verify_number_api"), data, content_type="application/json", **self.auth)
+
+    def list(self, i):
+        return self.client.get(reverse("get_numbers_api"), **self.auth)
+
+    def global_(self, i):
+        return self.client.get(reverse("global_armstrong_numbers_api"))
+
+    def run(self, scenario, requests):
+        """Send ``requests`` requests of ``scenario`` one after another and summarize them."""
+        send = getattr(self, "global_" if scenario == "global" else scenario)
+        latencies = []
+        queries = []
+        errors = 0
+        started = time.perf_counter()
+        for i in range(requests):
+            sent = time.perf_counter()
+            response = send(i)
+            latencies.append(time.perf_counter() - sent)
+            if response.status_code >= 400:
+                errors += 1
+            match = _QUERIES.search(response.get("Server-Timing", ""))
+            queries.append(int(match.group(1)) if match else 0)
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        budget = query_budget(scenario)
+        return {
+            "scenario": scenario,
+            "requests": requests,
+            "errors": errors,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "throughput": requests / elapsed,
+            "queries_mean": sum(queries) / requests,
+            "queries_max": max(queries),
+            "query_budget": budget,
+            "over_budget": max(queries) > budget,
+        }
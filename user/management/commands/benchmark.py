@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from user.benchmarks import SUITES
+
+
+class Command(BaseCommand):
+    help = "Run microbenchmarks and print the best time per item."
+
+    def add_arguments(self, parser):
+        parser.add_argument("suites", nargs="*", help=f"Suites to run: {', '.join(sorted(SUITES))} (default: all).")
+
+    def handle(self, *args, **options):
+        unknown = set(options["suites"]) - set(SUITES)
+        if unknown:
+            raise CommandError(f"Unknown suites: {', '.join(sorted(unknown))}.")
+
+        for name in options["suites"] or sorted(SUITES):
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for result in SUITES[name]():
+                self.stdout.write(
+                    f"  {result['label']:<55} {result['seconds_per_item'] * 1e6:>10.2f} µs/item"
+                    f"  ({result['items']} items)"
+                )
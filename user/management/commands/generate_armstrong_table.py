@@ -0,0 +1,88 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from user.armstrong import (
+    ARMSTRONG_MAX_LENGTH,
+    ARMSTRONG_NUMBERS,
+    BUNDLED_TABLES_PATH,
+    MAX_BASE,
+    MIN_BASE,
+    build_table,
+    search_armstrong_numbers,
+    table_length,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenerate the base-10 Armstrong number table with the combinatorial search, "
+        "or with --bundle the tables of the other bases shipped in user/armstrong_tables.json."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-length",
+            type=int,
+            default=ARMSTRONG_MAX_LENGTH,
+            help=f"Largest digit count to search (default: {ARMSTRONG_MAX_LENGTH}, the theoretical bound).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of worker processes (default: one per CPU).",
+        )
+        parser.add_argument(
+            "--output",
+            help="Write the numbers to this file, one per line, instead of stdout.",
+        )
+        parser.add_argument(
+            "--bundle",
+            action="store_true",
+            help="Rebuild the tables of every other base and write them to user/armstrong_tables.json.",
+        )
+
+    def handle(self, *args, **options):
+        if options["bundle"]:
+            self.bundle()
+            return
+        max_length = options["max_length"]
+        started = time.perf_counter()
+
+        numbers = []
+        for number in search_armstrong_numbers(0, 10 ** max_length - 1, workers=options["workers"]):
+            numbers.append(number)
+            if not options["output"]:
+                self.stdout.write(str(number))
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.writelines(f"{number}\n" for number in numbers)
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f"Found {len(numbers)} Armstrong numbers up to {max_length} digits in {elapsed:.1f}s.")
+
+        expected = {number for number in ARMSTRONG_NUMBERS if len(str(number)) <= max_length}
+        if set(numbers) == expected:
+            self.stderr.write(self.style.SUCCESS("Matches the table in user/armstrong.py."))
+        else:
+            self.stderr.write(self.style.ERROR(
+                f"Differs from the table in user/armstrong.py: "
+                f"missing {sorted(expected - set(numbers))}, extra {sorted(set(numbers) - expected)}."
+            ))
+
+    def bundle(self):
+        started = time.perf_counter()
+        tables = {}
+        for base in range(MIN_BASE, MAX_BASE + 1):
+            if base != 10:
+                table = build_table(base, table_length(base))
+                tables[str(base)] = {"length": table.length, "numbers": sorted(table.numbers)}
+        with open(BUNDLED_TABLES_PATH, "w") as f:
+            json.dump(tables, f, separators=(",", ":"))
+            f.write("\n")
+        self.stderr.write(self.style.SUCCESS(
+            f"Wrote {len(tables)} tables to {BUNDLED_TABLES_PATH} in {time.perf_counter() - started:.1f}s."
+        ))
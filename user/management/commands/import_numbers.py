@@ -0,0 +1,103 @@
+import sys
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from user import leaderboard
+from user.armstrong import MAX_BASE, MIN_BASE, is_armstrong
+from user.models import ArmstrongNumber, CustomUser
+from user.numbers_io import FORMATS, RowError, guess_format, parse_row, read_rows
+
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = "Import saved Armstrong numbers from a CSV or NDJSON file of (email, number, created_at) rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to read, or - for stdin.")
+        parser.add_argument("--format", choices=FORMATS, help="Input format (default: from the file extension, else csv).")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per bulk insert and transaction.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or guess_format(path)
+        try:
+            stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        except OSError as e:
+            raise CommandError(str(e))
+
+        self.user_ids = {}
+        self.imported_user_ids = set()
+        self.imported = self.skipped = self.already_saved = 0
+        self.started = time.perf_counter()
+        with stream:
+            rows = read_rows(stream, fmt)
+            while batch := list(islice(rows, options["batch_size"])):
+                self.import_batch(batch)
+                self.stderr.write(f"  {self.imported} rows imported ({self.rate():.0f} rows/s)\r", ending="")
+
+        # bulk_create skips post_save, so bring the summaries up to date in one pass.
+        leaderboard.rebuild(self.imported_user_ids)
+
+        elapsed = time.perf_counter() - self.started
+        already_saved = f", {self.already_saved} already saved" if self.already_saved else ""
+        self.stderr.write(self.style.SUCCESS(
+            f"Imported {self.imported} numbers, skipped {self.skipped} rows{already_saved} "
+            f"in {elapsed:.1f}s ({self.rate():.0f} rows/s)."
+        ))
+
+    def import_batch(self, batch):
+        parsed = []
+        for line_number, row in batch:
+            try:
+                email, number, base, created_at = parse_row(row)
+                if not MIN_BASE <= base <= MAX_BASE or not is_armstrong(number, base):
+                    raise RowError(f"{number} is not an Armstrong number in base {base}")
+            except RowError as e:
+                self.skip(line_number, e)
+            else:
+                parsed.append((line_number, email, number, base, created_at))
+
+        self.load_users({email for _, email, _, _, _ in parsed})
+        numbers = []
+        for line_number, email, number, base, created_at in parsed:
+            user_id = self.user_ids.get(email)
+            if user_id is None:
+                self.skip(line_number, f"no user with email {email}")
+            else:
+                numbers.append(ArmstrongNumber(user_id=user_id, value=number, base=base, created_at=created_at))
+                self.imported_user_ids.add(user_id)
+
+        with transaction.atomic():
+            if settings.ARMSTRONG_UNIQUE_SAVES:
+                # The database drops the numbers users already saved, so count
+                # the rows it kept. Each user has at most one row per number.
+                saves = ArmstrongNumber.objects.filter(user_id__in={row.user_id for row in numbers})
+                before = saves.count()
+                ArmstrongNumber.objects.bulk_create(numbers, ignore_conflicts=True)
+                inserted = saves.count() - before
+            else:
+                ArmstrongNumber.objects.bulk_create(numbers)
+                inserted = len(numbers)
+        self.imported += inserted
+        self.already_saved += len(numbers) - inserted
+
+    def load_users(self, emails):
+        """Add the ids of ``emails`` not looked up yet to ``self.user_ids``."""
+        missing = emails - self.user_ids.keys()
+        if missing:
+            # Remember unknown emails too, so they are not looked up again.
+            self.user_ids.update(dict.fromkeys(missing))
+            self.user_ids.update(CustomUser.objects.filter(email__in=missing).values_list("email", "id"))
+
+    def skip(self, line_number, reason):
+        self.skipped += 1
+        if self.skipped <= MAX_REPORTED_ERRORS:
+            self.stderr.write(self.style.WARNING(f"Line {line_number}: {reason}"))
+
+    def rate(self):
+        return self.imported / max(time.perf_counter() - self.started, 1e-9)
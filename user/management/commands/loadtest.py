@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from user.loadtest import QUERY_BUDGETS, LoadDriver, seed
+from user.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Seed a scratch database and measure latency, throughput and queries per request of each endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "scenarios", nargs="*", help=f"Scenarios to run: {', '.join(QUERY_BUDGETS)} (default: all).",
+        )
+        parser.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+        parser.add_argument("--seed", action="store_true", help="Create users and saved numbers first (SQLite only).")
+        parser.add_argument("--users", type=int, default=10_000, help="Users to create with --seed.")
+        parser.add_argument("--numbers", type=int, default=1_000_000, help="Saved numbers to create with --seed.")
+
+    def handle(self, *args, **options):
+        unknown = set(options["scenarios"]) - set(QUERY_BUDGETS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}.")
+
+        if options["seed"]:
+            if connection.vendor != "sqlite":
+                raise CommandError("--seed only runs against a SQLite database, to keep test data out of real ones.")
+            self.stdout.write(f"Seeding {options['users']} users and {options['numbers']} numbers...")
+            seed(options["users"], options["numbers"], stdout=self.stdout)
+            self.stdout.write("")
+
+        try:
+            driver = LoadDriver()
+        except CustomUser.DoesNotExist as e:
+            raise CommandError(str(e))
+
+        over_budget = []
+        self.stdout.write(
+            f"{'scenario':<12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>7} {'queries':>14}"
+        )
+        for scenario in options["scenarios"] or QUERY_BUDGETS:
+            result = driver.run(scenario, options["requests"])
+            line = (
+                f"{scenario:<12} {result['p50'] * 1000:>8.2f} {result['p95'] * 1000:>8.2f} {result['p99'] * 1000:>8.2f}"
+                f" {result['throughput']:>8.1f} {result['errors']:>7}"
+                f" {result['queries_mean']:>5.1f} (max {result['queries_max']}/{result['query_budget']})"
+            )
+            if result["over_budget"]:
+                over_budget.append(scenario)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+
+        if over_budget:
+            raise CommandError(f"Over the query budget: {', '.join(over_budget)}.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from user import leaderboard
+from user.models import ArmstrongNumberSummary
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's Armstrong number summary from the saved numbers."
+
+    def handle(self, *args, **options):
+        leaderboard.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {ArmstrongNumberSummary.objects.count()} Armstrong number summaries."
+        ))
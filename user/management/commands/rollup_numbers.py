@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from user import rollups
+from user.numbers_io import FORMATS, RowWriter, guess_format
+
+
+class Command(BaseCommand):
+    help = "Fold saved Armstrong numbers older than the retention period into daily rollups and delete them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, metavar="DAYS",
+            help="Fold saves made before the start of the day DAYS days ago (default: ARMSTRONG_RETENTION_DAYS).",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000, help="Saves folded and deleted per transaction.")
+        parser.add_argument("--archive", metavar="PATH", help="Also write the folded saves to this file before deleting them.")
+        parser.add_argument("--format", choices=FORMATS, help="Archive format (default: from the file extension, else csv).")
+
+    def handle(self, *args, **options):
+        if settings.ARMSTRONG_UNIQUE_SAVES:
+            raise CommandError(
+                "ARMSTRONG_UNIQUE_SAVES keeps one row per user and number already; there is nothing to roll up."
+            )
+        days = settings.ARMSTRONG_RETENTION_DAYS if options["older_than"] is None else options["older_than"]
+        if days < 0:
+            raise CommandError("--older-than must not be negative.")
+        cutoff = rollups.retention_cutoff(days)
+
+        stream = None
+        if options["archive"]:
+            path = options["archive"]
+            try:
+                # Appended to, so that runs can share an archive.
+                stream = open(path, "a", newline="", encoding="utf-8")
+            except OSError as e:
+                raise CommandError(str(e))
+            writer = RowWriter(stream, options["format"] or guess_format(path), header=stream.tell() == 0)
+
+            def write_archive(rows):
+                for row in rows:
+                    writer.write(*row)
+                stream.flush()
+        else:
+            write_archive = None
+
+        started = time.perf_counter()
+        folded = 0
+        try:
+            for count in rollups.fold(cutoff, options["batch_size"], write_archive):
+                folded += count
+                self.stderr.write(f"  {folded} saves folded\r", ending="")
+        finally:
+            if stream is not None:
+                stream.close()
+
+        self.stderr.write(self.style.SUCCESS(
+            f"Folded {folded} saves made before {cutoff:%Y-%m-%d} into daily rollups "
+            f"in {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,59 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from user.warmup import PROBES, warm_up
+
+# Run in a fresh interpreter: the clock starts before Django is imported.
+PROBE_SCRIPT = (
+    "import time; started = time.perf_counter(); "
+    "from user.warmup import cold_start_probe; cold_start_probe(started, warm={warm})"
+)
+
+
+class Command(BaseCommand):
+    help = "Warm up this process and print how long each step took, or measure a cold start with --cold-start."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cold-start", action="store_true",
+            help="Start fresh processes, with and without warmup, and time their setup and first requests.",
+        )
+
+    def handle(self, *args, **options):
+        if options["cold_start"]:
+            self.cold_start()
+            return
+        timings = warm_up()
+        for name, seconds in timings:
+            self.stdout.write(f"  {name:<25} {seconds * 1000:>8.1f} ms")
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed up in {sum(seconds for _, seconds in timings) * 1000:.1f} ms."
+        ))
+
+    def cold_start(self):
+        cold, warm = self.probe(warm=False), self.probe(warm=True)
+        self.stdout.write(f"  {'setup (imports and django.setup)':<40} {cold['setup'] * 1000:>8.1f} ms")
+        self.stdout.write(f"  {'warmup':<40} {warm['warmup'] * 1000:>8.1f} ms")
+        self.stdout.write(f"  {'request':<40} {'first':>8}  {'second':>8}  {'warm first':>10}  status")
+        for name, *_ in PROBES:
+            status, first = cold["first"][name]
+            self.stdout.write(
+                f"  {name:<40} {first * 1000:>5.1f} ms  {cold['second'][name][1] * 1000:>5.1f} ms"
+                f"  {warm['first'][name][1] * 1000:>7.1f} ms  {status}"
+            )
+
+    def probe(self, warm):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE, "ARMSTRONG_WARMUP": ""}
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE_SCRIPT.format(warm=warm)],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"Cold-start probe failed:\n{result.stderr}")
+        # Anything the app printed comes before the report.
+        return json.loads(result.stdout.splitlines()[-1])
@@ -0,0 +1,191 @@
+"""
+In-process request metrics, served in Prometheus text format at ``/metrics/``.
+
+``user.middleware.InstrumentationMiddleware`` opens a ``RequestMetrics`` for
+each request. SQL queries are counted and timed by a wrapper installed on
+every database connection, and the JSON renderers add the time they spend
+encoding. When the response is ready, the totals go into per-view histograms
+and the ``Server-Timing`` header. Each worker process keeps its own
+histograms; Prometheus sums them across the scraped workers.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_current = ContextVar("armstrong_request_metrics", default=None)
+
+
+class RequestMetrics:
+    """Totals collected while one request is handled."""
+
+    __slots__ = ("queries", "db_seconds", "serialization_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialization_seconds = 0.0
+
+
+class Histogram:
+    """A Prometheus histogram with one series per label value."""
+
+    def __init__(self, name, help_text, buckets, label="view"):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                # Per-bucket counts plus +Inf, then the sum.
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((label_value, list(counts), total) for label_value, (counts, total) in self._series.items())
+        for label_value, counts, total in series:
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "armstrong_request_duration_seconds", "Wall time spent handling a request.", DURATION_BUCKETS,
+)
+QUERIES = Histogram(
+    "armstrong_request_queries", "SQL queries run while handling a request.", QUERY_BUCKETS,
+)
+DB_SECONDS = Histogram(
+    "armstrong_request_db_seconds", "Time spent in SQL queries while handling a request.", DURATION_BUCKETS,
+)
+SERIALIZATION_SECONDS = Histogram(
+    "armstrong_request_serialization_seconds", "Time spent encoding JSON while handling a request.", DURATION_BUCKETS,
+)
+RESPONSE_BYTES = Histogram(
+    "armstrong_response_size_bytes", "Size of non-streaming response bodies, after compression.", SIZE_BUCKETS,
+)
+HISTOGRAMS = (REQUEST_SECONDS, QUERIES, DB_SECONDS, SERIALIZATION_SECONDS, RESPONSE_BYTES)
+
+# Seconds this process took to set up, to warm up (see user/warmup.py) and to
+# handle its first request, exported as armstrong_startup_<key>_seconds.
+STARTUP = {}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def start_request():
+    """Start collecting metrics for the current request; returns a token for ``end_request``."""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """``execute_wrapper`` that counts and times the queries of instrumented requests."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_seconds += time.perf_counter() - started
+
+
+def install_query_recorder(connection):
+    """Add ``record_query`` to a newly opened database connection."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def serialization():
+    """Time the block as serialization of the current request's response."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serialization_seconds += time.perf_counter() - started
+
+
+def set_startup(key, seconds):
+    STARTUP[key] = seconds
+
+
+def observe(view, metrics, seconds, size=None):
+    """Record a finished request in the histograms."""
+    STARTUP.setdefault("first_request", seconds)
+    REQUEST_SECONDS.observe(view, seconds)
+    QUERIES.observe(view, metrics.queries)
+    DB_SECONDS.observe(view, metrics.db_seconds)
+    SERIALIZATION_SECONDS.observe(view, metrics.serialization_seconds)
+    if size is not None:
+        RESPONSE_BYTES.observe(view, size)
+
+
+def server_timing(metrics, seconds):
+    """Return a ``Server-Timing`` header value for a finished request."""
+    return (
+        f'app;dur={seconds * 1000:.1f}, '
+        f'db;dur={metrics.db_seconds * 1000:.1f};desc="{metrics.queries} queries", '
+        f'ser;dur={metrics.serialization_seconds * 1000:.1f}'
+    )
+
+
+def exposition():
+    """Return every metric in Prometheus text format."""
+    from user.live import get_broker
+    from user.write_behind import get_save_buffer
+
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.exposition())
+
+    for key, value in sorted(STARTUP.items()):
+        name = f"armstrong_startup_{key}_seconds"
+        lines.extend([f"# TYPE {name} gauge", f"{name} {value}"])
+
+    save_buffer = get_save_buffer(create=False)
+    if save_buffer is not None:
+        for key, value in save_buffer.stats().items():
+            name = f"armstrong_save_buffer_{key}"
+            lines.extend([f"# TYPE {name} gauge", f"{name} {value}"])
+
+    broker = get_broker(create=False)
+    if broker is not None:
+        for key, value in broker.stats().items():
+            name = f"armstrong_live_{key}"
+            lines.extend([f"# TYPE {name} gauge", f"{name} {value}"])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,52 @@
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from user import metrics
+
+
+class InstrumentationMiddleware:
+    """Time each request, count its SQL queries and report both.
+
+    The totals are added to the ``/metrics/`` histograms under the view's URL
+    name and returned to the client in a ``Server-Timing`` header. Queries run
+    while a streaming response is consumed are not counted. Place it first in
+    ``MIDDLEWARE`` so that the times include the other middleware and response
+    sizes are measured after compression.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_metrics, token = metrics.start_request()
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.finish(request, response, request_metrics, perf_counter() - started)
+
+    async def __acall__(self, request):
+        request_metrics, token = metrics.start_request()
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.finish(request, response, request_metrics, perf_counter() - started)
+
+    def finish(self, request, response, request_metrics, seconds):
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        size = None if response.streaming else len(response.content)
+        metrics.observe(view, request_metrics, seconds, size)
+        response["Server-Timing"] = metrics.server_timing(request_metrics, seconds)
+        return response
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Add the per-user uniqueness constraint when ARMSTRONG_UNIQUE_SAVES is on."""
+
+    dependencies = [
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='armstrongnumber',
+            constraint=models.UniqueConstraint(fields=('user', 'number', 'base'), name='armstrong_unique_per_user'),
+        ),
+    ] if settings.ARMSTRONG_UNIQUE_SAVES else []
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_armstrong_unique_per_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='armstrongnumbersummary',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
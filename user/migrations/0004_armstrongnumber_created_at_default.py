@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0003_armstrongnumbersummary_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='armstrongnumber',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+import user.models
+
+
+class Migration(migrations.Migration):
+    """Store numbers wider than a BIGINT in wide_number. Existing rows all fit and keep using number."""
+
+    dependencies = [
+        ('user', '0004_armstrongnumber_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='armstrongnumber',
+            name='wide_number',
+            field=user.models.WideIntegerField(blank=True, max_digits=519, null=True),
+        ),
+        migrations.AlterField(
+            model_name='armstrongnumber',
+            name='number',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='armstrongnumber',
+            index=models.Index(fields=['wide_number'], name='armstrong_wide_number_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='armstrongnumber',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('number__isnull', False), ('wide_number__isnull', True)), models.Q(('number__isnull', True), ('wide_number__isnull', False)), _connector='OR'), name='armstrong_one_number_column'),
+        ),
+    ] + ([
+        migrations.AddConstraint(
+            model_name='armstrongnumber',
+            constraint=models.UniqueConstraint(fields=('user', 'wide_number', 'base'), name='armstrong_unique_wide_per_user'),
+        ),
+    ] if settings.ARMSTRONG_UNIQUE_SAVES else [])
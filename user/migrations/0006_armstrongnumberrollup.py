@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:42
+
+import django.db.models.deletion
+import user.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Add daily rollups of old saves. Every query of the saves now orders explicitly, so drop the default ordering."""
+
+    dependencies = [
+        ('user', '0005_armstrongnumber_wide_number'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='armstrongnumber',
+            options={},
+        ),
+        migrations.CreateModel(
+            name='ArmstrongNumberRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('wide_number', user.models.WideIntegerField(blank=True, max_digits=519, null=True)),
+                ('base', models.PositiveSmallIntegerField(default=10)),
+                ('day', models.DateField()),
+                ('count', models.PositiveIntegerField()),
+                ('first_saved_at', models.DateTimeField()),
+                ('last_saved_at', models.DateTimeField()),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='armstrong_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'armstrong_number_rollups',
+                'indexes': [models.Index(fields=['user', 'last_saved_at'], name='armstrong_rollup_user_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('number__isnull', False), ('wide_number__isnull', True)), models.Q(('number__isnull', True), ('wide_number__isnull', False)), _connector='OR'), name='armstrong_rollup_one_number_column'), models.UniqueConstraint(fields=('user', 'day', 'number', 'base'), name='armstrong_rollup_unique_day'), models.UniqueConstraint(fields=('user', 'day', 'wide_number', 'base'), name='armstrong_rollup_unique_wide_day')],
+            },
+            bases=(user.models.NumberValueMixin, models.Model),
+        ),
+    ]
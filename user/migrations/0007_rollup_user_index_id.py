@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0006_armstrongnumberrollup'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='armstrongnumberrollup',
+            name='armstrong_rollup_user_idx',
+        ),
+        migrations.AddIndex(
+            model_name='armstrongnumberrollup',
+            index=models.Index(fields=['user', 'last_saved_at', '-id'], name='armstrong_rollup_user_idx'),
+        ),
+    ]
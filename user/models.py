@@ -1,7 +1,11 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.core import exceptions, validators
 from django.db import models
 from django.utils import timezone
 
+from user.armstrong import MAX_BASE, MIN_BASE, max_length
+
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -42,14 +46,170 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
 
 
-class ArmstrongNumber(models.Model):
-    user = models.ForeignKey("user.CustomUser", on_delete=models.CASCADE, related_name="armstrong_numbers")
-    number = models.PositiveBigIntegerField()
-    created_at = models.DateTimeField(auto_now_add=True)
+# Largest value PositiveBigIntegerField stores on every supported database.
+MAX_BIG_NUMBER = 2 ** 63 - 1
+
+# Decimal digits of the widest value any supported base allows.
+WIDE_NUMBER_DIGITS = max(len(str(base ** max_length(base))) for base in range(MIN_BASE, MAX_BASE + 1))
+
+
+class WideIntegerField(models.CharField):
+    """
+    A non-negative integer of any size, stored as its decimal digits prefixed
+    with their zero-padded count ("039115132..." for a 39-digit number).
+
+    Longer numbers are larger, so the stored strings sort, compare and index
+    in numeric order on every database, and each value takes only three
+    characters more than its digits.
+    """
+
+    PREFIX_DIGITS = 3
+
+    default_error_messages = {"invalid": "“%(value)s” value must be an integer."}
+
+    def __init__(self, *args, max_digits=WIDE_NUMBER_DIGITS, **kwargs):
+        self.max_digits = max_digits
+        kwargs["max_length"] = self.PREFIX_DIGITS + max_digits
+        super().__init__(*args, **kwargs)
+        # Values are ints: check their range rather than CharField's length.
+        self.validators[:] = [
+            validator for validator in self.validators if not isinstance(validator, validators.MaxLengthValidator)
+        ] + [validators.MinValueValidator(0), validators.MaxValueValidator(10 ** max_digits - 1)]
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        del kwargs["max_length"]
+        kwargs["max_digits"] = self.max_digits
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else int(value[self.PREFIX_DIGITS:])
+
+    def to_python(self, value):
+        if value is None or isinstance(value, int):
+            return value
+        # Only from_db_value sees the stored, prefixed form.
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise exceptions.ValidationError(
+                self.error_messages["invalid"], code="invalid", params={"value": value}
+            )
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        digits = str(int(value))
+        return f"{len(digits):0{self.PREFIX_DIGITS}d}{digits}"
+
+
+class NumberValueMixin:
+    """``value`` for models that keep a number in ``number`` or, when wider than a BIGINT, ``wide_number``."""
+
+    @property
+    def value(self):
+        return self.number if self.number is not None else self.wide_number
+
+    @value.setter
+    def value(self, value):
+        if value <= MAX_BIG_NUMBER:
+            self.number, self.wide_number = value, None
+        else:
+            self.number, self.wide_number = None, value
+
+
+class ArmstrongNumber(NumberValueMixin, models.Model):
+    # Covered by the (user, created_at) index below, so no separate index.
+    user = models.ForeignKey(
+        "user.CustomUser", on_delete=models.CASCADE, related_name="armstrong_numbers", db_index=False
+    )
+    # Exactly one of these holds the saved value: ``number`` when it fits a
+    # BIGINT, ``wide_number`` otherwise. Read and set it through ``value``,
+    # which also works as a constructor argument.
+    number = models.PositiveBigIntegerField(null=True, blank=True)
+    wide_number = WideIntegerField(null=True, blank=True)
+    base = models.PositiveSmallIntegerField(default=10)
+    # A default rather than auto_now_add, so that imports can keep the original time.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         db_table = "armstrong_numbers"
-        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["user", "created_at"], name="armstrong_user_created_idx"),
+            models.Index(fields=["number"], name="armstrong_number_idx"),
+            models.Index(fields=["wide_number"], name="armstrong_wide_number_idx"),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    models.Q(number__isnull=False, wide_number__isnull=True)
+                    | models.Q(number__isnull=True, wide_number__isnull=False)
+                ),
+                name="armstrong_one_number_column",
+            ),
+        ] + ([
+            models.UniqueConstraint(fields=["user", "number", "base"], name="armstrong_unique_per_user"),
+            models.UniqueConstraint(fields=["user", "wide_number", "base"], name="armstrong_unique_wide_per_user"),
+        ] if settings.ARMSTRONG_UNIQUE_SAVES else [])
+
+    def __str__(self):
+        return f"{self.value} by {self.user.email}"
+
+
+
+class ArmstrongNumberRollup(NumberValueMixin, models.Model):
+    """How many times a user saved a number on one day, for days folded out of
+    ``ArmstrongNumber`` by ``manage.py rollup_numbers``."""
+
+    # Covered by the unique constraints and the (user, last_saved_at, -id) index below.
+    user = models.ForeignKey(
+        "user.CustomUser", on_delete=models.CASCADE, related_name="armstrong_rollups", db_index=False
+    )
+    number = models.PositiveBigIntegerField(null=True, blank=True)
+    wide_number = WideIntegerField(null=True, blank=True)
+    base = models.PositiveSmallIntegerField(default=10)
+    # In the project's TIME_ZONE.
+    day = models.DateField()
+    count = models.PositiveIntegerField()
+    first_saved_at = models.DateTimeField()
+    last_saved_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "armstrong_number_rollups"
+        indexes = [
+            models.Index(fields=["user", "last_saved_at", "-id"], name="armstrong_rollup_user_idx"),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    models.Q(number__isnull=False, wide_number__isnull=True)
+                    | models.Q(number__isnull=True, wide_number__isnull=False)
+                ),
+                name="armstrong_rollup_one_number_column",
+            ),
+            models.UniqueConstraint(fields=["user", "day", "number", "base"], name="armstrong_rollup_unique_day"),
+            models.UniqueConstraint(
+                fields=["user", "day", "wide_number", "base"], name="armstrong_rollup_unique_wide_day"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.value} saved {self.count} times on {self.day} by {self.user_id}"
+
+
+class ArmstrongNumberSummary(models.Model):
+    """Per-user totals kept in step with ``ArmstrongNumber`` by ``user.leaderboard``."""
+
+    user = models.OneToOneField(
+        "user.CustomUser", on_delete=models.CASCADE, primary_key=True, related_name="armstrong_summary"
+    )
+    count = models.PositiveIntegerField(default=0)
+    latest_saved_at = models.DateTimeField(null=True, blank=True)
+    numbers = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "armstrong_number_summaries"
 
     def __str__(self):
-        return f"{self.number} by {self.user.username}"
+        return f"{self.count} numbers by {self.user_id}"
@@ -0,0 +1,85 @@
+"""
+Reading and writing saved numbers as CSV or NDJSON, for ``import_numbers``
+and ``export_numbers``.
+
+Both formats carry ``email``, ``number``, ``base`` and ``created_at`` per row;
+``base`` and ``created_at`` are optional on import. Rows are read and written
+one at a time, so files of any size run in constant memory.
+"""
+import csv
+import json
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+FIELDS = ("email", "number", "base", "created_at")
+FORMATS = ("csv", "ndjson")
+
+
+class RowError(ValueError):
+    pass
+
+
+def guess_format(path):
+    """Return the format implied by ``path``'s extension, defaulting to CSV."""
+    return "ndjson" if str(path).endswith((".ndjson", ".jsonl")) else "csv"
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, row dict)`` for each record of a text stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError as e:
+                    yield line_number, RowError(f"invalid JSON: {e}")
+
+
+def parse_row(row):
+    """Return ``(email, number, base, created_at)`` from a raw row, or raise ``RowError``."""
+    if isinstance(row, RowError):
+        raise row
+    try:
+        email = str(row["email"]).strip()
+        number = int(row["number"])
+        base = int(row.get("base") or 10)
+    except (KeyError, TypeError, ValueError) as e:
+        raise RowError(f"bad email, number or base: {e!r}")
+    if not email or number < 0:
+        raise RowError("missing email or negative number")
+
+    created_at = row.get("created_at")
+    if created_at:
+        created_at = parse_datetime(str(created_at))
+        if created_at is None:
+            raise RowError(f"bad created_at {row['created_at']!r}")
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at)
+    else:
+        created_at = timezone.now()
+    return email, number, base, created_at
+
+
+class RowWriter:
+    """Writes exported rows to a text stream in one of ``FORMATS``."""
+
+    def __init__(self, stream, fmt, header=True):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == "csv":
+            self._csv = csv.writer(stream)
+            if header:
+                self._csv.writerow(FIELDS)
+
+    def write(self, email, number, base, created_at):
+        if self.fmt == "csv":
+            self._csv.writerow((email, number, base, created_at.isoformat()))
+        else:
+            self.stream.write(json.dumps(
+                {"email": email, "number": number, "base": base, "created_at": created_at.isoformat()}
+            ) + "\n")
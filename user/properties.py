@@ -0,0 +1,132 @@
+"""
+Digit-based properties of numbers, computed together by ``classify``.
+
+However many properties are asked for, a number is split into digits at most
+once: ``Digits`` works out the digit values, their counts, sum and product on
+first use, and the properties share them along with the power tables of
+``digit_powers``. Properties that have a finite set of solutions in base 10
+(Armstrong and disarium numbers) are membership tests that need no split at
+all.
+"""
+from functools import cached_property, lru_cache
+from math import log, prod
+
+from user.armstrong import ARMSTRONG_NUMBERS, DIGIT_VALUES, armstrong_bound, armstrong_table, to_base
+
+# Every base-10 disarium number (OEIS A032799): the sum of its digits raised
+# to their positions (1 for the leftmost) gives the number back. A number of
+# 23 or more digits is always larger than that sum, so the list is complete.
+DISARIUM_NUMBERS = frozenset({
+    0, 1, 2, 3, 4, 5, 6, 7, 8, 9,
+    89, 135, 175, 518, 598, 1306, 1676, 2427, 2646798,
+    12157692622039623539,
+})
+
+
+@lru_cache(maxsize=1024)
+def digit_powers(base: int, exponent: int) -> tuple:
+    """Return ``d ** exponent`` for every digit ``d`` of ``base``."""
+    return tuple(d ** exponent for d in range(base))
+
+
+class Digits:
+    """The digits of ``num`` in ``base``, decomposed once and on first use."""
+
+    def __init__(self, num: int, base: int = 10):
+        self.num = num
+        self.base = base
+
+    @cached_property
+    def values(self) -> list:
+        return list(map(DIGIT_VALUES.__getitem__, to_base(self.num, self.base)))
+
+    @cached_property
+    def counts(self) -> list:
+        counts = [0] * self.base
+        for value in self.values:
+            counts[value] += 1
+        return counts
+
+    @cached_property
+    def sum(self) -> int:
+        return sum(self.values)
+
+    @cached_property
+    def product(self) -> int:
+        return prod(self.values)
+
+    def power_sum(self, exponent: int) -> int:
+        """Return the sum of the digits each raised to ``exponent``."""
+        powers = digit_powers(self.base, exponent)
+        return sum(count * powers[digit] for digit, count in enumerate(self.counts) if count)
+
+
+def armstrong(digits: Digits) -> bool:
+    if digits.base == 10:
+        return digits.num in ARMSTRONG_NUMBERS
+    table = armstrong_table(digits.base)
+    if digits.num < table.limit:
+        return digits.num in table.numbers
+    if digits.num >= armstrong_bound(digits.base):
+        return False
+    return digits.power_sum(len(digits.values)) == digits.num
+
+
+def harshad(digits: Digits) -> bool:
+    """Divisible by the sum of its digits."""
+    return digits.num > 0 and digits.num % digits.sum == 0
+
+
+def perfect_digital_invariant(digits: Digits) -> bool:
+    """Equal to the sum of its digits raised to some common power."""
+    if armstrong(digits):
+        return True
+    top = max(digits.values)
+    if digits.num <= 1 or top <= 1:
+        # Powers of 0 and 1 never change, so the sum is the count of 1s.
+        return digits.num == digits.sum
+    # The sum grows with the exponent and is at most len * top ** exponent,
+    # so start where that bound reaches the number and stop once the sum does.
+    exponent = max(1, int((log(digits.num) - log(len(digits.values))) / log(top)))
+    while (total := digits.power_sum(exponent)) < digits.num:
+        exponent += 1
+    return total == digits.num
+
+
+def disarium(digits: Digits) -> bool:
+    """Equal to the sum of its digits raised to their positions."""
+    if digits.base == 10:
+        return digits.num in DISARIUM_NUMBERS
+    length = len(digits.values)
+    # The sum is at most length * (base - 1) ** length, while the number is at
+    # least base ** (length - 1); past the length where the first falls below
+    # the second, no number qualifies.
+    if (length - 1) * log(digits.base) > log(length) + length * log(digits.base - 1):
+        return False
+    return sum(value ** position for position, value in enumerate(digits.values, 1)) == digits.num
+
+
+def digit_sum(digits: Digits) -> int:
+    return digits.sum
+
+
+def digit_product(digits: Digits) -> int:
+    return digits.product
+
+
+CLASSIFIERS = {
+    "armstrong": armstrong,
+    "harshad": harshad,
+    "perfect_digital_invariant": perfect_digital_invariant,
+    "disarium": disarium,
+    "digit_sum": digit_sum,
+    "digit_product": digit_product,
+}
+
+PROPERTIES = tuple(CLASSIFIERS)
+
+
+def classify(num: int, base: int = 10, properties=PROPERTIES) -> dict:
+    """Return the value of each of ``properties`` for ``num`` written in ``base``."""
+    digits = Digits(num, base)
+    return {name: CLASSIFIERS[name](digits) for name in properties}
@@ -0,0 +1,55 @@
+"""
+JSON rendering for the API.
+
+orjson is used when it is installed and falls back to the standard library
+otherwise, or for values orjson cannot encode (such as integers wider than
+64 bits).
+"""
+import json
+
+from rest_framework.renderers import JSONRenderer
+
+from user import metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(data) -> bytes:
+    """Encode ``data`` as compact UTF-8 JSON."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_UTC_Z)
+        except TypeError:
+            pass
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode()
+
+
+def ndjson_lines(items):
+    """Yield each item of ``items`` as one line of NDJSON."""
+    for item in items:
+        yield dumps(item) + b"\n"
+
+
+async def andjson_lines(items):
+    """Async version of ``ndjson_lines`` for an async iterable of items."""
+    async for item in items:
+        yield dumps(item) + b"\n"
+
+
+class FastJSONRenderer(JSONRenderer):
+    """DRF's JSON renderer, with orjson doing the encoding when it is available."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with metrics.serialization():
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return orjson.dumps(data, option=orjson.OPT_UTC_Z)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,116 @@
+"""
+Compacting old saves into daily rollups.
+
+``ArmstrongNumber`` gets one row per save. ``fold`` moves the saves made
+before a cutoff into ``ArmstrongNumberRollup`` rows, one per user, number and
+day, holding how many times the number was saved that day and when first and
+last, and deletes the saves. ``manage.py rollup_numbers`` runs it for saves
+older than ``ARMSTRONG_RETENTION_DAYS``, so the table of saves only holds
+that many days.
+
+The listings read both tables: a user's listing shows each rollup once, as a
+save made at its ``last_saved_at`` (see ``services.user_numbers``), and the
+summaries behind the global listing count the saves of both (see
+``leaderboard.rebuild``). Folding does not change those totals, so it only
+marks the summaries it touched as updated.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from user import leaderboard
+from user.models import ArmstrongNumber, ArmstrongNumberRollup
+
+
+def retention_cutoff(days, now=None):
+    """Return the start of the local day ``days`` days ago; saves before it are folded."""
+    day = timezone.localdate(now) - timedelta(days=days)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def fold(cutoff, batch_size=5000, archive=None):
+    """Fold the saves made before ``cutoff`` into daily rollups, ``batch_size`` saves per transaction.
+
+    ``archive``, if given, is called with the ``(email, number, base,
+    created_at)`` of each batch's saves before they are deleted. Yields the
+    number of saves folded by each batch. A batch is folded and deleted in
+    one transaction, so an interrupted run loses nothing and the next one
+    picks up where it stopped. Run one at a time.
+    """
+    saves = ArmstrongNumber.objects.filter(created_at__lt=cutoff).order_by("id").values_list(
+        "id", "user_id", "user__email", "number", "wide_number", "base", "created_at"
+    )
+    db = router.db_for_write(ArmstrongNumber)
+    last_id = 0
+    while True:
+        with transaction.atomic(using=db):
+            batch = list(saves.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                return
+            _fold_batch(batch)
+            if archive is not None:
+                archive([
+                    (email, number if number is not None else wide_number, base, created_at)
+                    for _, _, email, number, wide_number, base, created_at in batch
+                ])
+            _delete_batch(db, cutoff, last_id, batch[-1][0])
+            leaderboard.touch({row[1] for row in batch})
+        last_id = batch[-1][0]
+        yield len(batch)
+
+
+def _delete_batch(db, cutoff, after_id, last_id):
+    """Delete the saves of a batch: those made before ``cutoff`` with ids in ``(after_id, last_id]``.
+
+    A plain DELETE rather than ``QuerySet.delete()``, which would load the
+    rows and send ``post_delete`` for each, and so rebuild the summaries of
+    their users. Folding keeps every total, so those rebuilds are not
+    needed; ``fold`` only touches the summaries. New saves get higher ids,
+    so the range holds exactly the batch.
+    """
+    connection = connections[db]
+    table = connection.ops.quote_name(ArmstrongNumber._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE id > %s AND id <= %s AND created_at < %s",
+            [after_id, last_id, connection.ops.adapt_datetimefield_value(cutoff)],
+        )
+
+
+def _fold_batch(batch):
+    """Add a batch of ``fold``'s rows to the rollups of their days."""
+    groups = {}
+    for _, user_id, _, number, wide_number, base, created_at in batch:
+        key = (user_id, timezone.localdate(created_at), number, wide_number, base)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = [1, created_at, created_at]
+        else:
+            group[0] += 1
+            group[1] = min(group[1], created_at)
+            group[2] = max(group[2], created_at)
+
+    # Rollups of these days exist when saves are imported after their day was folded.
+    existing = {
+        (rollup.user_id, rollup.day, rollup.number, rollup.wide_number, rollup.base): rollup
+        for rollup in ArmstrongNumberRollup.objects.select_for_update().filter(
+            user_id__in={key[0] for key in groups}, day__in={key[1] for key in groups}
+        )
+    }
+    created, updated = [], []
+    for key, (count, first_saved_at, last_saved_at) in groups.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            user_id, day, number, wide_number, base = key
+            created.append(ArmstrongNumberRollup(
+                user_id=user_id, number=number, wide_number=wide_number, base=base, day=day,
+                count=count, first_saved_at=first_saved_at, last_saved_at=last_saved_at,
+            ))
+        else:
+            rollup.count += count
+            rollup.first_saved_at = min(rollup.first_saved_at, first_saved_at)
+            rollup.last_saved_at = max(rollup.last_saved_at, last_saved_at)
+            updated.append(rollup)
+    ArmstrongNumberRollup.objects.bulk_create(created)
+    ArmstrongNumberRollup.objects.bulk_update(updated, ["count", "first_saved_at", "last_saved_at"])
@@ -0,0 +1,58 @@
+"""
+Database routing between the primary and an optional read replica.
+
+Writes, and reads by default, go to the primary. The read-only listings
+(the global listing, a user's numbers and the landing page built from the
+global listing) query through managers hinted with the listing they serve,
+and those reads go to the ``ARMSTRONG_READ_REPLICA`` alias when it is set.
+Once a write commits, the listings it changed are pinned to the primary for
+``ARMSTRONG_READ_AFTER_WRITE_SECONDS``, so that a user sees their own save,
+and the global listing is not cached from a replica that is behind. Reads
+made inside a transaction on the primary stay there too, since no replica
+sees its writes before it commits; this includes every ``TestCase``, whose
+replica alias is only a mirror of the primary's test database.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_KEY = "armstrong:primary:{}"
+
+GLOBAL_LISTING = "global"
+
+
+def user_listing(user_id):
+    return f"user:{user_id}"
+
+
+def listing_manager(model, listing):
+    """Return ``model``'s default manager, hinted to read ``listing`` from the replica."""
+    return model._default_manager.db_manager(hints={"listing": listing})
+
+
+def pin_primary(*listings):
+    """Read ``listings`` from the primary until the replica has caught up with a write."""
+    timeout = settings.ARMSTRONG_READ_AFTER_WRITE_SECONDS
+    if settings.ARMSTRONG_READ_REPLICA and timeout and listings:
+        cache.set_many({PIN_KEY.format(listing): True for listing in listings}, timeout=timeout)
+
+
+def is_pinned(listing):
+    return cache.get(PIN_KEY.format(listing)) is not None
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        listing = hints.get("listing")
+        replica = settings.ARMSTRONG_READ_REPLICA
+        if listing is None or not replica or connections[DEFAULT_DB_ALIAS].in_atomic_block or is_pinned(listing):
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        # Without this, saving an object read from the replica would write there.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
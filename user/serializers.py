@@ -1,9 +1,12 @@
+from datetime import datetime, timedelta, timezone
+
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import authenticate
 
-from user.models import CustomUser
+from user.armstrong import MAX_BASE, MIN_BASE, is_armstrong
+from user.properties import PROPERTIES
 
 User = get_user_model()
 
@@ -65,21 +68,80 @@ class LoginSerializer(serializers.Serializer):
 
 class ArmstrongSerializer(serializers.Serializer):
     number = serializers.IntegerField(required=True, min_value=0)
+    base = serializers.IntegerField(required=False, default=10, min_value=MIN_BASE, max_value=MAX_BASE)
+    properties = serializers.ListField(child=serializers.ChoiceField(choices=PROPERTIES), required=False)
 
-    def validate_number(self, value):
-        num_str = str(value)
-        power = len(num_str)
-        total = sum(int(digit) ** power for digit in num_str)
+    def validate(self, attrs):
+        # Asking for properties classifies any number instead of rejecting non-Armstrong ones.
+        if "properties" in attrs or is_armstrong(attrs["number"], attrs["base"]):
+            return attrs
+        raise serializers.ValidationError({"number": "This is not an Armstrong number."})
 
-        if value == total:
-            return value
-        raise serializers.ValidationError("This is not an Armstrong number.")
 
 
+class ArmstrongBatchSerializer(serializers.Serializer):
+    numbers = serializers.ListField(
+        child=serializers.IntegerField(min_value=0),
+        allow_empty=False,
+        max_length=10000,
+    )
+    save = serializers.BooleanField(default=False)
 
-class UserWithArmstrongNumbersSerializer(serializers.ModelSerializer):
-    armstrong_numbers = ArmstrongSerializer(many=True, read_only=True)
 
-    class Meta:
-        model = CustomUser
-        fields = ["id", "email", "armstrong_numbers"]
\ No newline at end of file
+
+class ArmstrongRangeSerializer(serializers.Serializer):
+    lo = serializers.IntegerField(required=True, min_value=0)
+    hi = serializers.IntegerField(required=True, min_value=0)
+
+    def validate(self, attrs):
+        if attrs["lo"] > attrs["hi"]:
+            raise serializers.ValidationError({"hi": "hi must be greater than or equal to lo."})
+        return attrs
+
+
+
+class CursorPaginationSerializer(serializers.Serializer):
+    MAX_PAGE_SIZE = 1000
+
+    cursor = serializers.IntegerField(required=False, min_value=0)
+    page_size = serializers.IntegerField(required=False, min_value=1, max_value=MAX_PAGE_SIZE)
+    stream = serializers.BooleanField(required=False, default=False)
+
+
+
+class SaveCursorField(serializers.Field):
+    """A (created_at, id) position in a user's saves, written as ``<microseconds>_<id>``."""
+
+    EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    # Largest BIGINT primary key. Rollups are positioned at negated ids.
+    MAX_ID = 2 ** 63 - 1
+
+    default_error_messages = {"invalid": "Invalid cursor."}
+
+    def to_internal_value(self, data):
+        try:
+            micros, pk = (int(part) for part in str(data).split("_"))
+            created_at = self.EPOCH + timedelta(microseconds=micros)
+        except (ValueError, OverflowError):
+            self.fail("invalid")
+        if micros < 0 or abs(pk) > self.MAX_ID:
+            self.fail("invalid")
+        return created_at, pk
+
+    def to_representation(self, value):
+        created_at, pk = value
+        return f"{(created_at - self.EPOCH) // timedelta(microseconds=1)}_{pk}"
+
+
+
+class UserNumbersQuerySerializer(serializers.Serializer):
+    MAX_PAGE_SIZE = 1000
+
+    cursor = SaveCursorField(required=False)
+    since = SaveCursorField(required=False)
+    page_size = serializers.IntegerField(required=False, min_value=1, max_value=MAX_PAGE_SIZE)
+
+    def validate(self, attrs):
+        if "cursor" in attrs and "since" in attrs:
+            raise serializers.ValidationError("Use either cursor or since, not both.")
+        return attrs
@@ -0,0 +1,416 @@
+"""
+In-process operations shared by the API views and the HTML views.
+
+The template views used to call the API over HTTP; they now call these
+functions directly, so a page render never opens a socket back to the server.
+Invalid input raises ``rest_framework.serializers.ValidationError`` with the
+same error dictionary the API returns.
+
+Functions prefixed with ``a`` are the async counterparts used by the ASGI
+views in ``user.async_views``; they share validation and result shaping with
+the sync versions and only differ in how they reach the database.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from user import leaderboard, routers
+from user.authentication import ArmstrongJWTAuthentication, tokens_for_user
+from user.armstrong import is_armstrong
+from user.properties import classify
+from user.models import ArmstrongNumber, ArmstrongNumberRollup, ArmstrongNumberSummary, CustomUser
+from user.write_behind import get_save_buffer
+from user.serializers import (
+    RegistrationSerializer,
+    LoginSerializer,
+    ArmstrongSerializer,
+    ArmstrongBatchSerializer,
+    SaveCursorField,
+)
+
+
+def register(data):
+    """Create a user from registration data."""
+    serializer = RegistrationSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.save()
+
+
+def login(data, request=None):
+    """Check credentials and return a fresh pair of JWT tokens."""
+    serializer = LoginSerializer(data=data, context={"request": request})
+    serializer.is_valid(raise_exception=True)
+
+    user = serializer.validated_data["user"]
+    refresh = tokens_for_user(user)
+
+    return {
+        "refresh": str(refresh),
+        "access": str(refresh.access_token),
+        "user": {
+            "id": user.id,
+            "email": user.email,
+        },
+    }
+
+
+def user_for_access_token(access):
+    """Return the user an access token belongs to, or None if the token is not valid."""
+    authentication = ArmstrongJWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(access))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+async def auser_for_access_token(access):
+    """Async version of ``user_for_access_token``."""
+    authentication = ArmstrongJWTAuthentication()
+    try:
+        return await authentication.aget_user(authentication.get_validated_token(access))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+def refresh_access_token(refresh):
+    """Return a new access token for a refresh token, or None if the refresh token is not valid."""
+    try:
+        return str(RefreshToken(refresh).access_token)
+    except TokenError:
+        return None
+
+
+def verify_number(user, data):
+    """Verify a number and save it for ``user`` when ``data["save"]`` is set."""
+    result = _verification(data)
+    # Save only if requested
+    if result["is_armstrong"] and data.get("save"):
+        if _save_numbers([ArmstrongNumber(user_id=user.pk, value=result["number"], base=result["base"])]):
+            _mark_saved(result)
+    return result
+
+
+async def averify_number(user, data):
+    """Async version of ``verify_number``."""
+    result = _verification(data)
+    if result["is_armstrong"] and data.get("save"):
+        row = ArmstrongNumber(user_id=user.pk, value=result["number"], base=result["base"])
+        if settings.ARMSTRONG_WRITE_BEHIND or settings.ARMSTRONG_UNIQUE_SAVES:
+            # The buffer may wait for room and unique saves need bulk_create's
+            # ignore_conflicts, so keep those on the sync path in a thread.
+            saved = await sync_to_async(_save_numbers)([row])
+        else:
+            # post_save folds the new row into the user's summary.
+            await row.asave()
+            saved = [row]
+        if saved:
+            _mark_saved(result)
+    return result
+
+
+def _verification(data):
+    serializer = ArmstrongSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+
+    number = serializer.validated_data["number"]
+    base = serializer.validated_data["base"]
+    armstrong = is_armstrong(number, base)
+    in_base = "" if base == 10 else f" in base {base}"
+
+    if armstrong:
+        message = f"{number} is an Armstrong number{in_base} ✅"
+    else:
+        message = f"{number} is not an Armstrong number{in_base} ❌"
+
+    result = {
+        "number": number,
+        "base": base,
+        "is_armstrong": armstrong,
+        "message": message,
+        "saved": False,
+    }
+    if "properties" in serializer.validated_data:
+        result["properties"] = classify(number, base, serializer.validated_data["properties"])
+    return result
+
+
+def _mark_saved(result):
+    result["saved"] = True
+    result["message"] += " (saved)"
+
+
+def verify_numbers(user, data):
+    """Verify many numbers and bulk-save the Armstrong ones if requested.
+
+    ``saved`` and ``saved_count`` only cover the numbers stored: with
+    ``ARMSTRONG_UNIQUE_SAVES`` on, numbers the user already had are not.
+    With write-behind on, they cover the numbers queued for saving.
+    """
+    serializer = ArmstrongBatchSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+
+    numbers = serializer.validated_data["numbers"]
+    save = serializer.validated_data["save"]
+
+    results = []
+    to_save = []
+    for number in numbers:
+        armstrong = is_armstrong(number)
+        result = {"number": number, "is_armstrong": armstrong, "saved": False}
+        if armstrong and save:
+            to_save.append((result, ArmstrongNumber(user_id=user.pk, value=number)))
+        results.append(result)
+
+    saved = {id(row) for row in _save_numbers([row for _, row in to_save])} if to_save else set()
+    for result, row in to_save:
+        result["saved"] = id(row) in saved
+
+    return {
+        "results": results,
+        "count": len(results),
+        "saved_count": len(saved),
+    }
+
+
+def _save_numbers(rows):
+    """Save ``rows`` now, or hand them to the write-behind buffer when it is enabled.
+
+    Returns the rows saved, or all of them once queued.
+    """
+    if settings.ARMSTRONG_WRITE_BEHIND:
+        get_save_buffer().put(rows)
+        return rows
+    return write_numbers(rows)
+
+
+def write_numbers(rows):
+    """Insert ``rows`` in one statement and fold them into the users' summaries.
+
+    With ``ARMSTRONG_UNIQUE_SAVES`` on, rows a user already saved are skipped
+    by the database instead of raising. Returns the rows actually saved.
+    """
+    ArmstrongNumber.objects.bulk_create(rows, ignore_conflicts=settings.ARMSTRONG_UNIQUE_SAVES)
+    # bulk_create does not send post_save, so update the summaries here.
+    return leaderboard.record_saves(rows)
+
+
+def user_numbers_validators(user):
+    """Return an (etag, last_modified) pair that changes whenever ``user``'s saves do."""
+    return _validators(user, _summary_validators(user).first())
+
+
+async def auser_numbers_validators(user):
+    """Async version of ``user_numbers_validators``."""
+    return _validators(user, await _summary_validators(user).afirst())
+
+
+def _summary_validators(user):
+    summaries = routers.listing_manager(ArmstrongNumberSummary, routers.user_listing(user.pk))
+    return summaries.filter(user_id=user.pk).values_list("count", "updated_at")
+
+
+def _validators(user, summary):
+    if summary is None:
+        return f'W/"user-{user.pk}-0"', None
+    count, updated_at = summary
+    return f'W/"user-{user.pk}-{count}-{updated_at.timestamp()}"', updated_at
+
+
+def user_numbers(user, cursor=None, since=None, page_size=None):
+    """Return one page of the Armstrong numbers saved by ``user``, as
+    ``{"number", "base"}`` entries like the global listing's.
+
+    Without ``since``, numbers come newest first and ``next_cursor`` pages
+    back through older saves; the first page also returns a ``sync_cursor``.
+    With ``since`` (a previous ``sync_cursor``), only numbers saved after it
+    are returned, oldest first, along with the ``sync_cursor`` to use next
+    time. Saves folded into daily rollups are listed once per number and
+    day, at the last save of the day. Either way the page is one query on
+    the (user, created_at) index of the saves and one on the (user,
+    last_saved_at, -id) index of the rollups.
+    """
+    page_size = page_size or settings.ARMSTRONG_USER_PAGE_SIZE
+    page = _merge_rows(
+        _user_numbers_rows(user, cursor, since, page_size), _user_rollup_rows(user, cursor, since, page_size),
+        since, page_size,
+    )
+    return _user_numbers_page(user, page, cursor, since, page_size)
+
+
+async def auser_numbers(user, cursor=None, since=None, page_size=None):
+    """Async version of ``user_numbers``."""
+    page_size = page_size or settings.ARMSTRONG_USER_PAGE_SIZE
+    page = _merge_rows(
+        [row async for row in _user_numbers_rows(user, cursor, since, page_size)],
+        [row async for row in _user_rollup_rows(user, cursor, since, page_size)],
+        since, page_size,
+    )
+    return _user_numbers_page(user, page, cursor, since, page_size)
+
+
+def _user_numbers_rows(user, cursor, since, page_size):
+    rows = routers.listing_manager(ArmstrongNumber, routers.user_listing(user.pk)).filter(user_id=user.pk)
+    if since is not None:
+        created_at, pk = since
+        rows = rows.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+        rows = rows.order_by("created_at", "id")
+    else:
+        if cursor is not None:
+            created_at, pk = cursor
+            rows = rows.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        rows = rows.order_by("-created_at", "-id")
+
+    # Fetch one extra row to learn whether another page follows.
+    return rows.values_list("number", "wide_number", "base", "created_at", "id")[:page_size + 1]
+
+
+def _user_rollup_rows(user, cursor, since, page_size):
+    # Rollups take their place among the saves at (last_saved_at, -id), so
+    # that one cursor pages through both and their positions never collide.
+    # Both orderings follow the directions of the (user, last_saved_at, -id)
+    # index, read backwards for the newest first.
+    rows = routers.listing_manager(ArmstrongNumberRollup, routers.user_listing(user.pk)).filter(user_id=user.pk)
+    if since is not None:
+        saved_at, pk = since
+        rows = rows.filter(Q(last_saved_at__gt=saved_at) | Q(last_saved_at=saved_at, id__lt=-pk))
+        rows = rows.order_by("last_saved_at", "-id")
+    else:
+        if cursor is not None:
+            saved_at, pk = cursor
+            rows = rows.filter(Q(last_saved_at__lt=saved_at) | Q(last_saved_at=saved_at, id__gt=-pk))
+        rows = rows.order_by("-last_saved_at", "id")
+    return rows.values_list("number", "wide_number", "base", "last_saved_at", "id")[:page_size + 1]
+
+
+def _merge_rows(rows, rollup_rows, since, page_size):
+    """Interleave a page of saves and a page of rollups in listing order."""
+    rollup_rows = [
+        (number, wide_number, base, saved_at, -pk) for number, wide_number, base, saved_at, pk in rollup_rows
+    ]
+    if not rollup_rows:
+        return list(rows)
+    page = sorted([*rows, *rollup_rows], key=lambda row: (row[3], row[4]), reverse=since is None)
+    return page[:page_size + 1]
+
+
+def _user_numbers_page(user, page, cursor, since, page_size):
+    has_more = len(page) > page_size
+    page = page[:page_size]
+    positions = [SaveCursorField().to_representation((created_at, pk)) for _, _, _, created_at, pk in page]
+
+    next_cursor = positions[-1] if has_more else None
+    if since is not None:
+        sync_cursor = positions[-1] if positions else SaveCursorField().to_representation(since)
+    else:
+        sync_cursor = positions[0] if cursor is None and positions else None
+
+    return {
+        "user": user.email,
+        "armstrong_numbers": [
+            {"number": number if number is not None else wide_number, "base": base}
+            for number, wide_number, base, _, _ in page
+        ],
+        "count": len(page),
+        "next_cursor": next_cursor,
+        "sync_cursor": sync_cursor,
+    }
+
+
+def global_numbers(cursor=None, page_size=None):
+    """Return one page of users with the Armstrong numbers they saved.
+
+    Pages are keyed on user id: pass the returned ``next_cursor`` back as
+    ``cursor`` to get the following page. ``next_cursor`` is None on the last
+    page. Pages are read from the per-user summaries and cached until the
+    next save.
+    """
+    page_size = page_size or settings.ARMSTRONG_GLOBAL_PAGE_SIZE
+    return leaderboard.cached_global(f"page:{cursor}:{page_size}", lambda: _global_page(cursor, page_size))
+
+
+async def aglobal_numbers(cursor=None, page_size=None):
+    """Async version of ``global_numbers``, sharing its cache entries."""
+    page_size = page_size or settings.ARMSTRONG_GLOBAL_PAGE_SIZE
+    return await leaderboard.acached_global(f"page:{cursor}:{page_size}", lambda: _aglobal_page(cursor, page_size))
+
+
+def _global_page(cursor, page_size):
+    page = [_global_user(user) for user in _global_page_users(cursor, page_size)]
+    return _global_page_data(page, _global_user_rows().count(), page_size)
+
+
+async def _aglobal_page(cursor, page_size):
+    page = [_global_user(user) async for user in _global_page_users(cursor, page_size)]
+    return _global_page_data(page, await _global_user_rows().acount(), page_size)
+
+
+def _global_page_users(cursor, page_size):
+    users = _global_users()
+    if cursor is not None:
+        users = users.filter(id__gt=cursor)
+    # Fetch one extra row to learn whether another page follows.
+    return users[:page_size + 1]
+
+
+def _global_page_data(page, total_users, page_size):
+    next_cursor = page[page_size - 1]["id"] if len(page) > page_size else None
+    return {
+        "total_users": total_users,
+        "users": page[:page_size],
+        "next_cursor": next_cursor,
+    }
+
+
+def iter_global_numbers(chunk_size=None):
+    """Yield every user with their Armstrong numbers, one keyset page of ``chunk_size`` users at a time.
+
+    Paged on user id rather than read with ``.iterator()``, which MySQL's
+    driver would buffer whole, so memory stays flat on every backend.
+    """
+    chunk_size = chunk_size or settings.ARMSTRONG_GLOBAL_PAGE_SIZE
+    last_id = 0
+    while page := list(_global_users().filter(id__gt=last_id)[:chunk_size]):
+        for user in page:
+            yield _global_user(user)
+        last_id = page[-1]["id"]
+
+
+async def aiter_global_numbers(chunk_size=None):
+    """Async version of ``iter_global_numbers``."""
+    chunk_size = chunk_size or settings.ARMSTRONG_GLOBAL_PAGE_SIZE
+    last_id = 0
+    while page := [user async for user in _global_users().filter(id__gt=last_id)[:chunk_size]]:
+        for user in page:
+            yield _global_user(user)
+        last_id = page[-1]["id"]
+
+
+def _global_user_rows():
+    return routers.listing_manager(CustomUser, routers.GLOBAL_LISTING).all()
+
+
+def _global_users():
+    return _global_user_rows().order_by("id").values(
+        "id",
+        "email",
+        "armstrong_summary__count",
+        "armstrong_summary__latest_saved_at",
+        "armstrong_summary__numbers",
+        "armstrong_summary__updated_at",
+    )
+
+
+def _global_user(row):
+    latest_saved_at = row["armstrong_summary__latest_saved_at"]
+    updated_at = row["armstrong_summary__updated_at"]
+    return {
+        "id": row["id"],
+        "email": row["email"],
+        "count": row["armstrong_summary__count"] or 0,
+        "latest_saved_at": latest_saved_at.isoformat() if latest_saved_at else None,
+        # Changes whenever this user's entry does.
+        "updated_at": updated_at.isoformat() if updated_at else None,
+        "armstrong_numbers": leaderboard.listed_entries(row["armstrong_summary__numbers"] or []),
+    }
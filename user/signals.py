@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from user import leaderboard, metrics
+from user.authentication import forget_user
+from user.models import ArmstrongNumber, CustomUser
+
+
+@receiver(post_save, sender=ArmstrongNumber)
+def armstrong_number_saved(sender, instance, created, **kwargs):
+    if created:
+        leaderboard.record_saves([instance])
+
+
+@receiver(post_delete, sender=ArmstrongNumber)
+def armstrong_number_deleted(sender, instance, **kwargs):
+    leaderboard.rebuild_on_commit(instance.user_id)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, **kwargs):
+    forget_user(instance.pk)
+    if created:
+        transaction.on_commit(leaderboard.bump_global_version)
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    forget_user(instance.pk)
+    transaction.on_commit(leaderboard.bump_global_version)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    metrics.install_query_recorder(connection)
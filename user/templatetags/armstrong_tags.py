@@ -0,0 +1,12 @@
+"""Template filters for showing saved numbers."""
+from django import template
+
+from user.armstrong import to_base
+
+register = template.Library()
+
+
+@register.filter
+def in_base(number, base):
+    """Return the digits of ``number`` written in ``base``."""
+    return to_base(int(number), base)
@@ -1,3 +1,1422 @@
-from django.test import TestCase
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection, connections, router, transaction
+from django.db.models import Count, Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from user.armstrong import (
+    ARMSTRONG_NUMBERS,
+    DIGITS,
+    MAX_BASE,
+    MIN_BASE,
+    armstrong_numbers_between,
+    armstrong_table,
+    build_table,
+    is_armstrong,
+    is_armstrong_reference,
+    search_armstrong_numbers,
+    table_length,
+    to_base,
+)
+from user.authentication import ClaimsUser, full_user, tokens_for_user
+from user import armstrong, benchmarks, leaderboard, live, loadtest, metrics, renderers, rollups, routers, services, warmup
+from user.models import ArmstrongNumber, ArmstrongNumberRollup, ArmstrongNumberSummary, CustomUser
+from user.properties import DISARIUM_NUMBERS, classify
+from user.renderers import FastJSONRenderer
+from user.serializers import ArmstrongSerializer
+from user.write_behind import SaveBuffer, SaveBufferFull
+
+
+class ArmstrongTableTests(SimpleTestCase):
+    def test_table_matches_reference(self):
+        for number in ARMSTRONG_NUMBERS:
+            self.assertTrue(is_armstrong_reference(number), number)
+
+    def test_table_is_complete_for_small_numbers(self):
+        for number in range(100_000):
+            self.assertEqual(is_armstrong(number), is_armstrong_reference(number), number)
+
+    def test_table_size(self):
+        # 88 narcissistic numbers plus 0.
+        self.assertEqual(len(ARMSTRONG_NUMBERS), 89)
+        self.assertEqual(len(str(max(ARMSTRONG_NUMBERS))), 39)
+
+    def test_serializer_uses_table(self):
+        self.assertTrue(ArmstrongSerializer(data={"number": 9474}).is_valid())
+        self.assertFalse(ArmstrongSerializer(data={"number": 9475}).is_valid())
+
+
+class ArmstrongSearchTests(SimpleTestCase):
+    def test_search_matches_table(self):
+        found = list(search_armstrong_numbers(0, 10 ** 12 - 1, workers=1))
+        self.assertEqual(found, list(armstrong_numbers_between(0, 10 ** 12 - 1)))
+
+    def test_search_respects_bounds(self):
+        self.assertEqual(list(search_armstrong_numbers(154, 9474, workers=1)), [370, 371, 407, 1634, 8208, 9474])
+
+    def test_search_with_process_pool(self):
+        self.assertEqual(list(search_armstrong_numbers(100, 99999, workers=2)), list(armstrong_numbers_between(100, 99999)))
+
+
+class ArmstrongBaseTests(SimpleTestCase):
+    def test_tables_match_reference(self):
+        for base in (2, 3, 5, 16, 36):
+            for number in range(10_000):
+                self.assertEqual(is_armstrong(number, base), is_armstrong_reference(number, base), (number, base))
+
+    def test_known_values(self):
+        # 0x156 = 1**3 + 5**3 + 6**3, 17 = "122" in base 3 = 1**3 + 2**3 + 2**3.
+        self.assertTrue(is_armstrong(0x156, 16))
+        self.assertTrue(is_armstrong(17, 3))
+        self.assertFalse(is_armstrong(153, 16))
+
+    def test_small_bases_are_fully_enumerated(self):
+        self.assertEqual(armstrong_table(3).numbers, {0, 1, 2, 5, 8, 17})
+
+    def test_bundled_tables_match_search(self):
+        bundled = armstrong.bundled_tables()
+        self.assertEqual(sorted(bundled), [base for base in range(MIN_BASE, MAX_BASE + 1) if base != 10])
+        for base in (2, 3, 4, 5, 6):
+            self.assertEqual(bundled[base], build_table(base, table_length(base)))
+        self.assertIs(armstrong_table(16), bundled[16])
+
+    def test_numbers_past_the_bound_are_rejected_without_summing(self):
+        huge = 36 ** 5000 - 1
+        with mock.patch.object(armstrong, "is_armstrong_reference") as reference:
+            self.assertFalse(is_armstrong(huge, 36))
+        reference.assert_not_called()
+        self.assertFalse(classify(huge, 36, ["armstrong"])["armstrong"])
+
+    @mock.patch.object(armstrong, "bundled_tables", return_value={})
+    def test_tables_are_cached_on_disk(self, bundled_tables):
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(ARMSTRONG_TABLE_CACHE_DIR=cache_dir):
+            armstrong_table.cache_clear()
+            table = armstrong_table(5)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            armstrong_table.cache_clear()
+            self.assertEqual(armstrong_table(5), table)
+        armstrong_table.cache_clear()
+
+    def test_rejects_unsupported_base(self):
+        with self.assertRaises(ValueError):
+            armstrong_table(37)
+
+
+class PropertyTests(SimpleTestCase):
+    @staticmethod
+    def reference(num, base=10):
+        digits = [DIGITS.index(ch) for ch in to_base(num, base)]
+        exponents = range(1, max(2, num.bit_length() + 1))
+        return {
+            "armstrong": is_armstrong_reference(num, base),
+            "harshad": num > 0 and num % sum(digits) == 0,
+            "perfect_digital_invariant": any(sum(d ** p for d in digits) == num for p in exponents),
+            "disarium": sum(d ** i for i, d in enumerate(digits, 1)) == num,
+            "digit_sum": sum(digits),
+            "digit_product": math.prod(digits),
+        }
+
+    def test_matches_reference(self):
+        for base in (10, 7, 16):
+            for num in range(2000):
+                self.assertEqual(classify(num, base), self.reference(num, base), (num, base))
+
+    def test_known_values(self):
+        self.assertTrue(classify(4150)["perfect_digital_invariant"])
+        self.assertFalse(classify(4150)["armstrong"])
+        self.assertTrue(classify(12157692622039623539)["disarium"])
+        self.assertEqual(
+            classify(115132219018763992565095597973971522401, properties=("armstrong", "digit_sum")),
+            {"armstrong": True, "digit_sum": 171},
+        )
+
+    def test_disarium_other_bases(self):
+        for base in (2, 3, 36):
+            for num in range(3000):
+                digits = [DIGITS.index(ch) for ch in to_base(num, base)]
+                expected = sum(d ** i for i, d in enumerate(digits, 1)) == num
+                self.assertEqual(classify(num, base, ["disarium"])["disarium"], expected, (num, base))
+        # Too long for any number to qualify, answered without summing 4000 powers.
+        self.assertFalse(classify(36 ** 4000 - 1, 36, ["disarium"])["disarium"])
+
+    def test_disarium_table_matches_reference(self):
+        self.assertEqual(
+            sorted(n for n in DISARIUM_NUMBERS if n < 10 ** 5),
+            [n for n in range(10 ** 5) if self.reference(n)["disarium"]],
+        )
+
+    def test_properties_benchmark_runs(self):
+        labels = [row["label"] for row in benchmarks.properties(samples=8, lengths=(3, 39))]
+        self.assertIn("classify, all properties (one digit split)", labels)
+
+
+class ArmstrongRangeAPITests(APITestCase):
+    def test_streams_ndjson(self):
+        res = self.client.get(reverse("armstrong_numbers_range_api"), {"lo": 100, "hi": 1000})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in b"".join(res.streaming_content).splitlines()]
+        self.assertEqual(lines, [{"number": 153}, {"number": 370}, {"number": 371}, {"number": 407}])
+
+    def test_rejects_inverted_range(self):
+        res = self.client.get(reverse("armstrong_numbers_range_api"), {"lo": 10, "hi": 1})
+        self.assertEqual(res.status_code, 400)
+
+
+class VerifyNumbersBatchAPITests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="batch@example.com", password="StrongPass123!")
+        self.client.force_authenticate(self.user)
+
+    def test_batch_classifies_and_bulk_saves(self):
+        res = self.client.post(
+            reverse("verify_numbers_batch_api"),
+            {"numbers": [153, 154, 9474], "save": True},
+            format="json",
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            res.json()["results"],
+            [
+                {"number": 153, "is_armstrong": True, "saved": True},
+                {"number": 154, "is_armstrong": False, "saved": False},
+                {"number": 9474, "is_armstrong": True, "saved": True},
+            ],
+        )
+        self.assertEqual(res.json()["saved_count"], 2)
+        self.assertEqual(ArmstrongNumber.objects.filter(user=self.user).count(), 2)
+
+    def test_batch_without_save_persists_nothing(self):
+        res = self.client.post(reverse("verify_numbers_batch_api"), {"numbers": [153]}, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(ArmstrongNumber.objects.exists())
+
+    def test_batch_rejects_negative_numbers(self):
+        res = self.client.post(reverse("verify_numbers_batch_api"), {"numbers": [-1]}, format="json")
+        self.assertEqual(res.status_code, 400)
+
+
+class VerifyNumberAPITests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="verify@example.com", password="StrongPass123!")
+        self.client.force_authenticate(self.user)
+
+    def test_verify_and_save(self):
+        res = self.client.post(reverse("verify_number_api"), {"number": 153, "save": True}, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.json()["is_armstrong"])
+        self.assertTrue(res.json()["saved"])
+        self.assertEqual(ArmstrongNumber.objects.get(user=self.user).base, 10)
+
+    def test_rejects_non_armstrong_number(self):
+        res = self.client.post(reverse("verify_number_api"), {"number": 154}, format="json")
+        self.assertEqual(res.status_code, 400)
+
+    def test_properties(self):
+        data = {"number": 18, "properties": ["harshad", "disarium", "digit_sum"], "save": True}
+        res = self.client.post(reverse("verify_number_api"), data, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(res.json()["is_armstrong"])
+        self.assertFalse(res.json()["saved"])
+        self.assertEqual(res.json()["properties"], {"harshad": True, "disarium": False, "digit_sum": 9})
+
+        res = self.client.post(reverse("verify_number_api"), {"number": 153, "properties": ["prime"]}, format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(res.json()["is_armstrong"])
+
+    def test_verify_in_other_base(self):
+        res = self.client.post(reverse("verify_number_api"), {"number": 0x156, "base": 16, "save": True}, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["base"], 16)
+        self.assertEqual(ArmstrongNumber.objects.get(user=self.user).base, 16)
+
+    def test_rejects_out_of_range_base(self):
+        res = self.client.post(reverse("verify_number_api"), {"number": 1, "base": 37}, format="json")
+        self.assertEqual(res.status_code, 400)
+
+
+class PageTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="page@example.com", password="StrongPass123!")
+
+    def test_register_page_creates_user(self):
+        res = self.client.post(
+            reverse("register"),
+            {"email": "new@example.com", "password1": "StrongPass123!", "password2": "StrongPass123!"},
+        )
+        self.assertRedirects(res, reverse("login"))
+        self.assertTrue(CustomUser.objects.filter(email="new@example.com").exists())
+
+    def test_login_then_verify_and_save(self):
+        res = self.client.post(reverse("login"), {"email": "page@example.com", "password": "StrongPass123!"})
+        self.assertRedirects(res, reverse("verify_number"))
+
+        res = self.client.post(reverse("verify_number"), {"number": 370, "action": "save"})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.context["user_numbers"]["armstrong_numbers"], [{"number": 370, "base": 10}])
+
+    def test_pages_show_the_base_of_non_decimal_numbers(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ArmstrongNumber.objects.create(user=self.user, number=0x156, base=16)
+            ArmstrongNumber.objects.create(user=self.user, number=153)
+        self.client.post(reverse("login"), {"email": "page@example.com", "password": "StrongPass123!"})
+        for name in ("verify_number", "global_page"):
+            res = self.client.get(reverse(name))
+            self.assertContains(res, "156<sub>16</sub>")
+            self.assertContains(res, ">153<")
+
+    def test_login_page_shows_invalid_credentials(self):
+        res = self.client.post(reverse("login"), {"email": "page@example.com", "password": "wrong"})
+        self.assertContains(res, "Invalid email or password.")
+
+    def test_verify_page_requires_login(self):
+        self.assertRedirects(self.client.get(reverse("verify_number")), reverse("login"))
+
+    def test_global_page_lists_users(self):
+        ArmstrongNumber.objects.create(user=self.user, number=407)
+        res = self.client.get(reverse("global_page"))
+        self.assertContains(res, "page@example.com")
+        self.assertContains(res, "407")
+
+
+class GlobalArmstrongNumbersAPITests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            CustomUser.objects.create_user(email=f"user{i}@example.com", password="StrongPass123!")
+            for i in range(5)
+        ]
+        for user in self.users:
+            ArmstrongNumber.objects.create(user=user, number=153)
+
+    def test_cursor_pagination(self):
+        url = reverse("global_armstrong_numbers_api")
+        seen = []
+        params = {"page_size": 2}
+        while True:
+            data = self.client.get(url, params).json()
+            self.assertEqual(data["total_users"], 5)
+            seen += [user["email"] for user in data["users"]]
+            if data["next_cursor"] is None:
+                break
+            params["cursor"] = data["next_cursor"]
+        self.assertEqual(seen, [user.email for user in self.users])
+
+    def test_page_query_count_does_not_grow_with_users(self):
+        with self.assertNumQueries(2):
+            self.client.get(reverse("global_armstrong_numbers_api"), {"page_size": 5})
+
+    def test_pages_are_cached_until_next_save(self):
+        url = reverse("global_armstrong_numbers_api")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ArmstrongNumber.objects.create(user=self.users[0], number=9474)
+        data = self.client.get(url).json()
+        self.assertEqual(data["users"][0]["count"], 2)
+        self.assertEqual(
+            data["users"][0]["armstrong_numbers"],
+            [{"number": 153, "base": 10}, {"number": 9474, "base": 10}],
+        )
+
+    def test_stream_ndjson(self):
+        res = self.client.get(reverse("global_armstrong_numbers_api"), {"stream": 1, "page_size": 2})
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in b"".join(res.streaming_content).splitlines()]
+        self.assertEqual([line["email"] for line in lines], [user.email for user in self.users])
+        self.assertEqual(lines[0]["armstrong_numbers"], [{"number": 153, "base": 10}])
+
+    def test_stream_reads_users_a_page_at_a_time(self):
+        with CaptureQueriesContext(connection) as queries:
+            users = list(services.iter_global_numbers(chunk_size=2))
+        self.assertEqual([user["email"] for user in users], [user.email for user in self.users])
+        # Pages of 2, 2 and 1 users, then an empty one, each limited to the chunk size.
+        self.assertEqual(len(queries), 4)
+        self.assertTrue(all("LIMIT 2" in query["sql"] for query in queries))
+
+    def test_rejects_oversized_page(self):
+        res = self.client.get(reverse("global_armstrong_numbers_api"), {"page_size": 10_000})
+        self.assertEqual(res.status_code, 400)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="board@example.com", password="StrongPass123!")
+
+    def test_summary_follows_saves_and_deletes(self):
+        first = ArmstrongNumber.objects.create(user=self.user, number=153)
+        ArmstrongNumber.objects.create(user=self.user, number=153)
+        ArmstrongNumber.objects.create(user=self.user, number=5, base=3)
+        summary = ArmstrongNumberSummary.objects.get(user=self.user)
+        self.assertEqual(summary.count, 3)
+        self.assertEqual(summary.numbers, [{"number": 5, "base": 3}, {"number": 153, "base": 10}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        summary.refresh_from_db()
+        self.assertEqual(summary.count, 2)
+        self.assertEqual(len(summary.numbers), 2)
+
+    def test_bulk_delete_rebuilds_once(self):
+        ArmstrongNumber.objects.bulk_create([ArmstrongNumber(user=self.user, number=153) for _ in range(50)])
+        ArmstrongNumber.objects.create(user=self.user, number=370)
+        with mock.patch.object(leaderboard, "rebuild", wraps=leaderboard.rebuild) as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                ArmstrongNumber.objects.filter(number=153).delete()
+        rebuild.assert_called_once_with({self.user.pk})
+        summary = ArmstrongNumberSummary.objects.get(user=self.user)
+        self.assertEqual((summary.count, summary.numbers), (1, [{"number": 370, "base": 10}]))
+
+    def test_delete_after_a_rolled_back_delete_still_rebuilds(self):
+        for number in (153, 370):
+            ArmstrongNumber.objects.create(user=self.user, number=number)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ArmstrongNumber.objects.filter(number=153).delete()
+            raise IntegrityError
+        with self.captureOnCommitCallbacks(execute=True):
+            ArmstrongNumber.objects.filter(number=370).delete()
+        summary = ArmstrongNumberSummary.objects.get(user=self.user)
+        self.assertEqual((summary.count, summary.numbers), (1, [{"number": 153, "base": 10}]))
+
+    def test_bulk_saves_update_summary(self):
+        leaderboard.record_saves(
+            ArmstrongNumber.objects.bulk_create([ArmstrongNumber(user=self.user, number=n) for n in (370, 371)])
+        )
+        self.assertEqual(ArmstrongNumberSummary.objects.get(user=self.user).count, 2)
+
+    def test_rebuild_matches_incremental_summary(self):
+        for number in (153, 370, 153):
+            ArmstrongNumber.objects.create(user=self.user, number=number)
+        incremental = ArmstrongNumberSummary.objects.get(user=self.user)
+        ArmstrongNumberSummary.objects.all().delete()
+
+        leaderboard.rebuild()
+        rebuilt = ArmstrongNumberSummary.objects.get(user=self.user)
+        self.assertEqual(
+            (rebuilt.count, rebuilt.latest_saved_at, rebuilt.numbers),
+            (incremental.count, incremental.latest_saved_at, incremental.numbers),
+        )
+
+
+class ArmstrongNumberIndexTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="index@example.com", password="StrongPass123!")
+
+    def test_user_listing_uses_user_indexes(self):
+        position = (timezone.now(), 10)
+        for cursor, since in ((None, None), (position, None), (None, position)):
+            with self.subTest(cursor=cursor, since=since):
+                plan = services._user_numbers_rows(self.user, cursor, since, 10).explain()
+                self.assertIn("armstrong_user_created_idx", plan)
+                # The indexes already yield rows in listing order.
+                self.assertNotIn("TEMP B-TREE", plan)
+                plan = services._user_rollup_rows(self.user, cursor, since, 10).explain()
+                self.assertIn("armstrong_rollup_user_idx", plan)
+                self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_grouping_by_user_uses_user_created_index(self):
+        plan = ArmstrongNumber.objects.order_by().values("user_id").annotate(count=Count("id")).explain()
+        self.assertIn("armstrong_user_created_idx", plan)
+
+    def test_number_lookup_uses_number_index(self):
+        plan = ArmstrongNumber.objects.filter(number=153).explain()
+        self.assertIn("armstrong_number_idx", plan)
+
+    @override_settings(ARMSTRONG_UNIQUE_SAVES=True)
+    def test_unique_saves_absorb_repeats(self):
+        # The test database is migrated with the setting off, so add the index here.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE UNIQUE INDEX armstrong_unique_per_user ON armstrong_numbers (user_id, number, base)"
+            )
+        saved = [services.verify_number(self.user, {"number": 153, "save": True})["saved"] for _ in range(2)]
+        self.assertEqual(saved, [True, False])
+        batch = services.verify_numbers(self.user, {"numbers": [153, 370, 370], "save": True})
+        self.assertEqual([result["saved"] for result in batch["results"]], [False, True, False])
+        self.assertEqual(batch["saved_count"], 1)
+
+        self.assertEqual(ArmstrongNumber.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(ArmstrongNumberSummary.objects.get(user=self.user).count, 2)
+
+
+class WideNumberTests(APITestCase):
+    WIDE = 115132219018763992565095597973971522401
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="wide@example.com", password="StrongPass123!")
+        self.client.force_authenticate(self.user)
+
+    def test_save_and_list_wide_number(self):
+        res = self.client.post(reverse("verify_number_api"), {"number": self.WIDE, "save": True}, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.json()["saved"])
+
+        row = ArmstrongNumber.objects.get(user=self.user)
+        self.assertEqual((row.number, row.wide_number, row.value), (None, self.WIDE, self.WIDE))
+        entries = self.client.get(reverse("get_numbers_api")).json()["armstrong_numbers"]
+        self.assertEqual(entries, [{"number": self.WIDE, "base": 10}])
+        entries = self.client.get(reverse("global_armstrong_numbers_api")).json()["users"][0]["armstrong_numbers"]
+        self.assertEqual(entries, [{"number": self.WIDE, "base": 10}])
+
+    def test_values_that_fit_keep_the_bigint_column(self):
+        fits = ArmstrongNumber(user=self.user, value=2 ** 63 - 1)
+        self.assertEqual((fits.number, fits.wide_number), (2 ** 63 - 1, None))
+        wide = ArmstrongNumber(user=self.user, value=2 ** 63)
+        self.assertEqual((wide.number, wide.wide_number), (None, 2 ** 63))
+
+    def test_wide_numbers_sort_and_filter_numerically(self):
+        wide = sorted(n for n in ARMSTRONG_NUMBERS if n > 2 ** 63 - 1)
+        ArmstrongNumber.objects.bulk_create([ArmstrongNumber(user=self.user, value=n) for n in reversed(wide)])
+        self.assertEqual(list(ArmstrongNumber.objects.order_by("wide_number").values_list("wide_number", flat=True)), wide)
+        self.assertEqual(ArmstrongNumber.objects.filter(wide_number__gt=10 ** 30).count(), sum(n > 10 ** 30 for n in wide))
+        self.assertIn("armstrong_wide_number_idx", ArmstrongNumber.objects.filter(wide_number=self.WIDE).explain())
+
+    def test_field_parses_and_validates_plain_values(self):
+        field = ArmstrongNumber._meta.get_field("wide_number")
+        self.assertEqual(field.to_python(str(self.WIDE)), self.WIDE)
+        with self.assertRaises(ValidationError):
+            field.to_python("not a number")
+        ArmstrongNumber(user=self.user, value=self.WIDE).full_clean()
+        with self.assertRaises(ValidationError):
+            ArmstrongNumber(user=self.user, number=None, wide_number=10 ** 600).full_clean()
+
+    def test_exactly_one_number_column_is_set(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ArmstrongNumber.objects.create(user=self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ArmstrongNumber.objects.create(user=self.user, number=153, wide_number=self.WIDE)
+
+    def test_summary_keeps_wide_numbers_exact(self):
+        services.verify_number(self.user, {"number": self.WIDE, "save": True})
+        services.verify_number(self.user, {"number": 153, "save": True})
+        summary = ArmstrongNumberSummary.objects.get(user=self.user)
+        self.assertEqual(summary.numbers, [{"number": 153, "base": 10}, {"number": str(self.WIDE), "base": 10}])
+
+        leaderboard.rebuild()
+        summary.refresh_from_db()
+        self.assertEqual(summary.count, 2)
+        self.assertEqual(leaderboard.listed_entries(summary.numbers)[1], {"number": self.WIDE, "base": 10})
+
+    def test_export_then_import_wide_number(self):
+        ArmstrongNumber.objects.create(user=self.user, value=self.WIDE)
+        stdout = StringIO()
+        call_command("export_numbers", stdout=stdout, stderr=StringIO())
+        self.assertIn(f",{self.WIDE},10,", stdout.getvalue())
+
+        ArmstrongNumber.objects.all().delete()
+        with mock.patch("sys.stdin", StringIO(stdout.getvalue())):
+            call_command("import_numbers", "-", stderr=StringIO())
+        self.assertEqual(ArmstrongNumber.objects.get().value, self.WIDE)
+
+
+class UserNumbersAPITests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="numbers@example.com", password="StrongPass123!")
+        self.client.force_authenticate(self.user)
+        for number in (1, 2, 3, 4, 5):
+            ArmstrongNumber.objects.create(user=self.user, number=number)
+
+    def numbers(self, data):
+        return [entry["number"] for entry in data["armstrong_numbers"]]
+
+    def test_pages_newest_first(self):
+        url = reverse("get_numbers_api")
+        first = self.client.get(url, {"page_size": 2}).json()
+        self.assertEqual(first["armstrong_numbers"], [{"number": 5, "base": 10}, {"number": 4, "base": 10}])
+        self.assertEqual(first["count"], 2)
+
+        second = self.client.get(url, {"page_size": 2, "cursor": first["next_cursor"]}).json()
+        self.assertEqual(self.numbers(second), [3, 2])
+        third = self.client.get(url, {"page_size": 2, "cursor": second["next_cursor"]}).json()
+        self.assertEqual(self.numbers(third), [1])
+        self.assertIsNone(third["next_cursor"])
+
+    def test_since_returns_only_new_saves(self):
+        url = reverse("get_numbers_api")
+        sync_cursor = self.client.get(url).json()["sync_cursor"]
+        ArmstrongNumber.objects.create(user=self.user, number=6)
+        ArmstrongNumber.objects.create(user=self.user, number=7)
+
+        data = self.client.get(url, {"since": sync_cursor}).json()
+        self.assertEqual(self.numbers(data), [6, 7])
+        data = self.client.get(url, {"since": data["sync_cursor"]}).json()
+        self.assertEqual(data["armstrong_numbers"], [])
+        self.assertIsNotNone(data["sync_cursor"])
+
+    def test_entries_carry_their_base(self):
+        ArmstrongNumber.objects.create(user=self.user, number=0x156, base=16)
+        data = self.client.get(reverse("get_numbers_api"), {"page_size": 1}).json()
+        self.assertEqual(data["armstrong_numbers"], [{"number": 0x156, "base": 16}])
+
+    def test_page_queries(self):
+        # One query for the ETag/Last-Modified validators, one for the page's
+        # saves and one for its rollups.
+        with self.assertNumQueries(3):
+            self.client.get(reverse("get_numbers_api"), {"page_size": 2})
+
+    def test_rejects_malformed_cursor(self):
+        res = self.client.get(reverse("get_numbers_api"), {"cursor": "nope"})
+        self.assertEqual(res.status_code, 400)
+
+    def test_rejects_out_of_range_cursor(self):
+        url = reverse("get_numbers_api")
+        self.assertEqual(self.client.get(url, {"cursor": "99999999999999999999_1"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"since": "-99999999999999999999_1"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"since": "-1_1"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"cursor": f"1_{2 ** 64}"}).status_code, 400)
+
+
+@override_settings(ARMSTRONG_READ_REPLICA="replica", ARMSTRONG_READ_AFTER_WRITE_SECONDS=5)
+class ReplicaRoutingTests(APITransactionTestCase):
+    # Outside a transaction, since reads inside one stay on the primary.
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="replica@example.com", password="StrongPass123!")
+        self.other = CustomUser.objects.create_user(email="other@example.com", password="StrongPass123!")
+        cache.clear()
+
+    def test_listings_read_the_replica(self):
+        self.assertEqual(services._global_users().db, "replica")
+        self.assertEqual(services._user_numbers_rows(self.user, None, None, 10).db, "replica")
+        self.assertEqual(services._summary_validators(self.user).db, "replica")
+
+    def test_everything_else_uses_the_primary(self):
+        self.assertEqual(CustomUser.objects.all().db, "default")
+        replica_user = CustomUser(pk=self.user.pk)
+        replica_user._state.db = "replica"
+        self.assertEqual(router.db_for_write(CustomUser, instance=replica_user), "default")
+
+    def test_reads_in_a_transaction_use_the_primary(self):
+        with transaction.atomic():
+            self.assertEqual(services._global_users().db, "default")
+        self.assertEqual(services._global_users().db, "replica")
+
+    @override_settings(ARMSTRONG_READ_REPLICA="")
+    def test_no_replica_configured(self):
+        self.assertEqual(services._global_users().db, "default")
+
+    def test_writes_pin_listings_to_the_primary(self):
+        services.verify_number(self.user, {"number": 153, "save": True})
+
+        self.assertEqual(services._user_numbers_rows(self.user, None, None, 10).db, "default")
+        self.assertEqual(services._global_users().db, "default")
+        self.assertEqual(services._user_numbers_rows(self.other, None, None, 10).db, "replica")
+
+        cache.delete_many([routers.PIN_KEY.format(routers.user_listing(self.user.pk)), routers.PIN_KEY.format("global")])
+        self.assertEqual(services._user_numbers_rows(self.user, None, None, 10).db, "replica")
+
+
+class SettingsTests(SimpleTestCase):
+    def load_settings(self, **overrides):
+        ignored = ("CACHE_BACKEND", "DEBUG", "DB_REPLICA_HOST", "DB_REPLICA_NAME")
+        env = {key: value for key, value in os.environ.items() if key not in ignored}
+        env.update(DB_ENGINE="sqlite", **overrides)
+        return subprocess.run(
+            [sys.executable, "-c", "import number_verification.settings"],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+
+    def test_workers_require_a_shared_cache(self):
+        for env in ({"DB_REPLICA_NAME": "replica.sqlite3"}, {"DEBUG": "false"}):
+            with self.subTest(env=env):
+                result = self.load_settings(**env)
+                self.assertEqual(result.returncode, 1)
+                self.assertIn("ImproperlyConfigured", result.stderr)
+                shared = self.load_settings(CACHE_BACKEND="django.core.cache.backends.redis.RedisCache", **env)
+                self.assertEqual(shared.returncode, 0, shared.stderr)
+
+    def test_a_debug_process_may_keep_its_own_cache(self):
+        result = self.load_settings()
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+@skipUnless("replica" in settings.DATABASES, "needs a replica database alias")
+@override_settings(ARMSTRONG_READ_REPLICA="replica")
+class ReplicaDatabaseTests(APITransactionTestCase):
+    # Committed writes, so that the replica connection can read them.
+    databases = {"default", "replica"} if "replica" in settings.DATABASES else {"default"}
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="mirror@example.com", password="StrongPass123!")
+        ArmstrongNumber.objects.create(user=self.user, number=153)
+        cache.clear()
+
+    def test_global_listing_queries_the_replica(self):
+        with CaptureQueriesContext(connections["replica"]) as replica_queries:
+            res = self.client.get(reverse("global_armstrong_numbers_api"))
+        self.assertEqual(res.json()["users"][0]["armstrong_numbers"], [{"number": 153, "base": 10}])
+        self.assertEqual(len(replica_queries), 2)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="etag@example.com", password="StrongPass123!")
+        ArmstrongNumber.objects.create(user=self.user, number=153)
+
+    def test_global_listing_returns_304_until_next_save(self):
+        url = reverse("global_armstrong_numbers_api")
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ArmstrongNumber.objects.create(user=self.user, number=370)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_global_listing_is_gzipped(self):
+        for i in range(20):
+            CustomUser.objects.create_user(email=f"gzip{i}@example.com", password="StrongPass123!")
+        res = self.client.get(reverse("global_armstrong_numbers_api"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(res["Content-Encoding"], "gzip")
+
+    def test_landing_page_returns_304(self):
+        etag = self.client.get(reverse("global_page"))["ETag"]
+        self.assertEqual(self.client.get(reverse("global_page"), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_user_numbers_return_304_until_next_save(self):
+        self.client.force_authenticate(self.user)
+        url = reverse("get_numbers_api")
+        res = self.client.get(url)
+        etag, last_modified = res["ETag"], res["Last-Modified"]
+
+        with self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        ArmstrongNumber.objects.create(user=self.user, number=370)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SaveBufferTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="buffer@example.com", password="StrongPass123!")
+
+    def test_queued_saves_are_written_on_flush(self):
+        buffer = SaveBuffer(batch_size=2, flush_ms=1, autostart=False)
+        buffer.put([ArmstrongNumber(user=self.user, number=n) for n in (153, 370, 371)])
+        self.assertEqual(buffer.stats()["queue_depth"], 3)
+        self.assertFalse(ArmstrongNumber.objects.exists())
+
+        buffer.flush()
+        self.assertEqual(ArmstrongNumber.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(ArmstrongNumberSummary.objects.get(user=self.user).count, 3)
+        stats = buffer.stats()
+        self.assertEqual((stats["queue_depth"], stats["flushes"], stats["flushed_rows"]), (0, 2, 3))
+
+    def test_full_queue_applies_backpressure(self):
+        buffer = SaveBuffer(max_queue=1, put_timeout=0, autostart=False)
+        buffer.put([ArmstrongNumber(user=self.user, number=153)])
+        with self.assertRaises(SaveBufferFull):
+            buffer.put([ArmstrongNumber(user=self.user, number=370)])
+        self.assertEqual(buffer.stats()["rejected_rows"], 1)
+
+    def test_batches_are_queued_whole_or_not_at_all(self):
+        buffer = SaveBuffer(max_queue=3, put_timeout=0, autostart=False)
+        buffer.put([ArmstrongNumber(user=self.user, number=153)])
+        with self.assertRaises(SaveBufferFull):
+            buffer.put([ArmstrongNumber(user=self.user, number=n) for n in (370, 371, 407)])
+        self.assertEqual(buffer.stats()["queue_depth"], 1)
+        buffer.flush()
+        self.assertEqual(list(ArmstrongNumber.objects.values_list("number", flat=True)), [153])
+
+    def test_failed_writes_are_retried(self):
+        buffer = SaveBuffer(flush_ms=1, max_retries=2, autostart=False)
+        rows = [ArmstrongNumber(user=self.user, number=n) for n in (153, 370)]
+        failures = [DatabaseError("down")]
+
+        def write_numbers(rows, write_numbers=services.write_numbers):
+            if failures:
+                raise failures.pop()
+            return write_numbers(rows)
+
+        with mock.patch("user.services.write_numbers", side_effect=write_numbers), \
+                self.assertLogs("user.write_behind", "ERROR"):
+            buffer._write_with_retries(rows)
+        self.assertEqual(sorted(ArmstrongNumber.objects.values_list("number", flat=True)), [153, 370])
+        stats = buffer.stats()
+        self.assertEqual((stats["failed_writes"], stats["dropped_rows"], stats["flushed_rows"]), (1, 0, 2))
+
+    def test_rows_are_dropped_after_the_last_retry(self):
+        buffer = SaveBuffer(flush_ms=1, max_retries=2, autostart=False)
+        with mock.patch("user.services.write_numbers", side_effect=DatabaseError("down")), \
+                self.assertLogs("user.write_behind", "ERROR") as logs:
+            buffer._write_with_retries([ArmstrongNumber(user=self.user, number=153)])
+        stats = buffer.stats()
+        self.assertEqual((stats["failed_writes"], stats["dropped_rows"]), (3, 1))
+        self.assertIn(f"({self.user.pk}, 153, 10)", logs.output[-1])
+
+    def test_retries_stop_on_shutdown_and_requeue_the_batch(self):
+        buffer = SaveBuffer(flush_ms=1, max_retries=2, autostart=False)
+        buffer._stopped.set()
+        with mock.patch("user.services.write_numbers", side_effect=DatabaseError("down")), \
+                self.assertLogs("user.write_behind", "ERROR"):
+            buffer._write_with_retries([ArmstrongNumber(user=self.user, number=153)])
+        self.assertEqual(buffer.stats()["queue_depth"], 1)
+        buffer.flush()
+        self.assertEqual(list(ArmstrongNumber.objects.values_list("number", flat=True)), [153])
+
+    @override_settings(ARMSTRONG_WRITE_BEHIND=True)
+    def test_verify_endpoint_returns_503_when_buffer_is_full(self):
+        full = SaveBuffer(max_queue=1, put_timeout=0, autostart=False)
+        full.put([ArmstrongNumber(user=self.user, number=1)])
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch("user.services.get_save_buffer", return_value=full):
+            res = client.post(reverse("verify_number_api"), {"number": 153, "save": True}, format="json")
+        self.assertEqual(res.status_code, 503)
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def test_matches_stdlib_output(self):
+        data = {"users": [{"id": 1, "email": "a@example.com", "armstrong_numbers": [{"number": 153, "base": 10}]}]}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), data)
+
+    def test_falls_back_for_wide_integers(self):
+        number = max(ARMSTRONG_NUMBERS)
+        self.assertEqual(json.loads(FastJSONRenderer().render({"number": number})), {"number": number})
+        self.assertEqual(json.loads(renderers.dumps({"number": number})), {"number": number})
+
+    def test_serialization_benchmark_runs(self):
+        results = benchmarks.serialization(users=10, numbers_per_user=2)
+        self.assertTrue(all(result["seconds_per_item"] > 0 for result in results))
+
+
+@override_settings(ROOT_URLCONF="user.async_urls")
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="async@example.com", password="StrongPass123!")
+        self.auth = {"AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    async def test_verify_save_and_list(self):
+        res = await self.async_client.post(
+            reverse("verify_number_api"), {"number": 153, "save": True}, content_type="application/json", headers=self.auth,
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.json()["saved"])
+
+        res = await self.async_client.get(reverse("get_numbers_api"), headers=self.auth)
+        self.assertEqual(res.json()["armstrong_numbers"], [{"number": 153, "base": 10}])
+        summary = await ArmstrongNumberSummary.objects.aget(user=self.user)
+        self.assertEqual(summary.count, 1)
+
+        res = await self.async_client.get(reverse("get_numbers_api"), headers={**self.auth, "If-None-Match": res["ETag"]})
+        self.assertEqual(res.status_code, 304)
+
+    async def test_rejects_invalid_number_and_missing_token(self):
+        res = await self.async_client.post(
+            reverse("verify_number_api"), {"number": 154}, content_type="application/json", headers=self.auth,
+        )
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(res.json()["is_armstrong"])
+
+        res = await self.async_client.get(reverse("get_numbers_api"))
+        self.assertEqual(res.status_code, 401)
+
+    async def test_global_matches_sync_view(self):
+        await ArmstrongNumber.objects.acreate(user=self.user, number=407)
+        res = await self.async_client.get(reverse("global_armstrong_numbers_api"))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), await sync_to_async(services.global_numbers)())
+
+        res = await self.async_client.get(reverse("global_armstrong_numbers_api"), {"stream": "true"})
+        lines = [json.loads(line) async for line in res.streaming_content]
+        self.assertEqual(lines[0]["armstrong_numbers"], [{"number": 407, "base": 10}])
+
+    async def test_pages(self):
+        await self.async_client.post(reverse("login"), {"email": "async@example.com", "password": "StrongPass123!"})
+        res = await self.async_client.post(reverse("verify_number"), {"number": 370, "action": "save"})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.context["user_numbers"]["armstrong_numbers"], [{"number": 370, "base": 10}])
+
+        res = await self.async_client.get(reverse("global_page"))
+        self.assertContains(res, "async@example.com")
+
+    async def test_slow_requests_are_served_concurrently(self):
+        delay = 0.2
+        aglobal_version = leaderboard.aglobal_version
+
+        async def slow_version():
+            await asyncio.sleep(delay)
+            return await aglobal_version()
+
+        with mock.patch.object(leaderboard, "aglobal_version", slow_version):
+            started = time.perf_counter()
+            responses = await asyncio.gather(
+                *(self.async_client.get(reverse("global_armstrong_numbers_api")) for _ in range(10))
+            )
+            elapsed = time.perf_counter() - started
+
+        self.assertTrue(all(res.status_code == 200 for res in responses))
+        # Run one after another, the requests would take at least 10 * delay.
+        self.assertLess(elapsed, 5 * delay)
+
+
+@override_settings(ROOT_URLCONF="user.async_urls")
+class LiveFeedTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="live@example.com", password="StrongPass123!")
+        patcher = mock.patch.object(live, "_broker", live.LocalBroker(replay_size=3, queue_size=2))
+        self.broker = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def read_events(self, stream, count):
+        """Return the next ``count`` chunks of ``stream``, after its retry line."""
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        return [await asyncio.wait_for(anext(stream), 1) for _ in range(count)]
+
+    async def test_saves_are_pushed_to_subscribers(self):
+        res = await self.async_client.get(reverse("armstrong_numbers_stream"))
+        self.assertEqual(res["Content-Type"], "text/event-stream")
+        stream = aiter(res.streaming_content)
+        first = asyncio.ensure_future(self.read_events(stream, 1))
+        await asyncio.sleep(0.05)
+
+        # Saves happen on another thread, as they would in a sync view.
+        def save():
+            with self.captureOnCommitCallbacks(execute=True):
+                services.verify_number(self.user, {"number": 9474, "save": True})
+
+        await sync_to_async(save)()
+        (chunk,) = await first
+        event_id, name, data = chunk.decode().strip().split("\n")
+        self.assertTrue(event_id.startswith("id: "))
+        self.assertEqual(name, "event: save")
+        self.assertEqual(json.loads(data[len("data: "):])["number"], 9474)
+
+        # ASGI cancels the response when the client disconnects.
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(self.broker.stats()["subscribers"], 0)
+
+    async def test_stream_is_not_compressed(self):
+        res = await self.async_client.get(reverse("armstrong_numbers_stream"), headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(res["Content-Encoding"], "identity")
+        stream = aiter(res.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        await stream.aclose()
+
+    async def test_resume_from_last_event_id(self):
+        events = [self.broker.publish({"number": number}) for number in (153, 370, 371)]
+        res = await self.async_client.get(
+            reverse("armstrong_numbers_stream"), headers={"Last-Event-ID": str(events[0].id)},
+        )
+        stream = aiter(res.streaming_content)
+        chunks = await self.read_events(stream, 2)
+        self.assertEqual([chunk.split(b"\n")[0] for chunk in chunks], [b"id: %d" % e.id for e in events[1:]])
+        await stream.aclose()
+
+    async def test_reset_when_events_were_dropped(self):
+        events = [self.broker.publish({"number": number}) for number in (0, 1, 153, 370, 371)]
+        stream = live.sse_events(events[0].id)
+        chunks = await self.read_events(stream, 4)
+        self.assertTrue(chunks[0].startswith(b"event: reset"))
+        self.assertEqual([chunk.split(b"\n")[0] for chunk in chunks[1:]], [b"id: %d" % e.id for e in events[2:]])
+        await stream.aclose()
+
+    async def test_slow_subscriber_is_disconnected(self):
+        stream = live.sse_events()
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        await asyncio.to_thread(lambda: [self.broker.publish({"number": n}) for n in range(5)])
+        await asyncio.sleep(0.05)
+        # The queue holds two events; the stream sends them and ends.
+        self.assertEqual(len([chunk async for chunk in stream]), 2)
+        self.assertEqual(self.broker.stats()["subscribers"], 0)
+
+    async def test_idle_streams_get_keep_alives(self):
+        stream = live.sse_events(heartbeat=0.01)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        self.assertEqual(await anext(stream), b": keep-alive\n\n")
+        await stream.aclose()
+
+
+class AuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="auth@example.com", password="StrongPass123!")
+        access = self.client.post(
+            reverse("login_api"), {"email": "auth@example.com", "password": "StrongPass123!"}, format="json",
+        ).json()["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def user_queries(self, queries):
+        return [query["sql"] for query in queries if CustomUser._meta.db_table in query["sql"]]
+
+    @override_settings(ARMSTRONG_STATELESS_AUTH=True)
+    def test_stateless_verify_runs_no_queries(self):
+        with self.assertNumQueries(0):
+            res = self.client.post(reverse("verify_number_api"), {"number": 153}, format="json")
+        self.assertEqual(res.status_code, 200)
+
+    @override_settings(ARMSTRONG_STATELESS_AUTH=True)
+    def test_stateless_save_and_list(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("verify_number_api"), {"number": 153, "save": True}, format="json")
+            res = self.client.get(reverse("get_numbers_api"))
+        self.assertEqual(self.user_queries(queries.captured_queries), [])
+        self.assertEqual(res.json()["user"], "auth@example.com")
+        self.assertEqual(res.json()["armstrong_numbers"], [{"number": 153, "base": 10}])
+
+    @override_settings(ARMSTRONG_STATELESS_AUTH=True)
+    def test_stateless_rejects_inactive_claim(self):
+        access = tokens_for_user(self.user).access_token
+        access["is_active"] = False
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        res = self.client.post(reverse("verify_number_api"), {"number": 153}, format="json")
+        self.assertEqual(res.status_code, 401)
+
+    def test_user_lookup_without_cache(self):
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(reverse("verify_number_api"), {"number": 153}, format="json")
+            self.assertEqual(len(self.user_queries(queries.captured_queries)), 1)
+
+    @override_settings(ARMSTRONG_USER_CACHE_TIMEOUT=60)
+    def test_user_cache(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("verify_number_api"), {"number": 153}, format="json")
+        self.assertEqual(len(self.user_queries(queries.captured_queries)), 1)
+        with self.assertNumQueries(0):
+            self.client.post(reverse("verify_number_api"), {"number": 153}, format="json")
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.post(reverse("verify_number_api"), {"number": 153}, format="json")
+        self.assertEqual(res.status_code, 401)
+
+    @override_settings(ARMSTRONG_USER_CACHE_TIMEOUT=60)
+    def test_full_user(self):
+        claims_user = ClaimsUser(tokens_for_user(self.user).access_token)
+        self.assertEqual(claims_user.email, "auth@example.com")
+        self.assertEqual(full_user(claims_user), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(full_user(claims_user), self.user)
+
+
+class InstrumentationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        for histogram in metrics.HISTOGRAMS:
+            histogram.clear()
+        self.user = CustomUser.objects.create_user(email="metrics@example.com", password="StrongPass123!")
+
+    def test_server_timing_counts_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse("global_armstrong_numbers_api"))
+        self.assertIn("app;dur=", res["Server-Timing"])
+        self.assertIn(f'desc="{len(queries)} queries"', res["Server-Timing"])
+        self.assertIn("ser;dur=", res["Server-Timing"])
+
+    def test_metrics_endpoint(self):
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse("verify_number_api"), {"number": 153}, format="json")
+        self.client.post(reverse("verify_number_api"), {"number": 153}, format="json")
+
+        res = self.client.get(reverse("metrics"))
+        self.assertEqual(res.status_code, 200)
+        body = res.content.decode()
+        self.assertIn('armstrong_request_duration_seconds_count{view="verify_number_api"} 2', body)
+        self.assertIn('armstrong_request_queries_bucket{view="verify_number_api",le="0"} 2', body)
+        self.assertIn('armstrong_response_size_bytes_bucket{view="verify_number_api",le="+Inf"} 2', body)
+
+    def test_metrics_are_limited_to_allowed_addresses(self):
+        self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.5").status_code, 403)
+        with override_settings(ARMSTRONG_METRICS_ALLOWED_IPS=["10.0.0.1", "203.0.113.0/24"]):
+            self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.5").status_code, 200)
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", (1, 2))
+        for value in (0.5, 1, 1.5, 3):
+            histogram.observe("a", value)
+        self.assertEqual(histogram.exposition()[2:], [
+            'test_seconds_bucket{view="a",le="1"} 2',
+            'test_seconds_bucket{view="a",le="2"} 3',
+            'test_seconds_bucket{view="a",le="+Inf"} 4',
+            'test_seconds_sum{view="a"} 6.0',
+            'test_seconds_count{view="a"} 4',
+        ])
+
+    @override_settings(ROOT_URLCONF="user.async_urls")
+    async def test_async_views_count_queries(self):
+        res = await self.async_client.get(reverse("global_armstrong_numbers_api"))
+        # The users page and the user count, run from the ORM's thread.
+        self.assertIn('desc="2 queries"', res["Server-Timing"])
+
+
+class QueryBudgetTests(TestCase):
+    """Every endpoint stays within its query budget however much data there is."""
+
+    @classmethod
+    def setUpTestData(cls):
+        loadtest.seed(users=30, numbers=600)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertWithinBudget(self, results):
+        for result in results:
+            self.assertEqual(result["errors"], 0, result["scenario"])
+            self.assertFalse(result["over_budget"], result)
+
+    def test_query_budgets(self):
+        driver = loadtest.LoadDriver(client=self.client)
+        self.assertWithinBudget([driver.run(scenario, 3) for scenario in loadtest.QUERY_BUDGETS])
+
+    @override_settings(ARMSTRONG_STATELESS_AUTH=True)
+    def test_query_budgets_with_stateless_auth(self):
+        driver = loadtest.LoadDriver(client=self.client)
+        self.assertWithinBudget([driver.run(scenario, 3) for scenario in loadtest.AUTHENTICATED_SCENARIOS])
+
+    def test_global_page_reads_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(loadtest.QUERY_BUDGETS["global"]):
+            res = self.client.get(reverse("global_armstrong_numbers_api"), {"page_size": 30})
+        self.assertEqual(len(res.json()["users"]), 30)
+
+    def test_armstrong_benchmark_runs(self):
+        results = benchmarks.armstrong(samples=3, lengths=(1, 39))
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(result["seconds_per_item"] > 0 for result in results))
+
+
+class RollupTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="rollup@example.com", password="StrongPass123!")
+        self.client.force_authenticate(self.user)
+        day = rollups.retention_cutoff(100)
+        for number, created_at in (
+            (153, day + timedelta(hours=1)),
+            (153, day + timedelta(hours=2)),
+            (370, day + timedelta(hours=3)),
+            (153, day + timedelta(hours=4)),
+            (9474, day + timedelta(days=1)),
+        ):
+            ArmstrongNumber.objects.create(user=self.user, number=number, created_at=created_at)
+        ArmstrongNumber.objects.create(user=self.user, number=407)
+
+    def roll_up(self, **options):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("rollup_numbers", older_than=30, batch_size=2, stderr=StringIO(), **options)
+
+    def summary(self):
+        return ArmstrongNumberSummary.objects.values_list("count", "latest_saved_at", "numbers").get(user=self.user)
+
+    def test_folds_old_saves_into_daily_rollups(self):
+        summary = self.summary()
+        self.roll_up()
+
+        self.assertEqual(list(ArmstrongNumber.objects.values_list("number", flat=True)), [407])
+        self.assertEqual(
+            sorted(ArmstrongNumberRollup.objects.values_list("number", "count")), [(153, 3), (370, 1), (9474, 1)],
+        )
+        self.assertEqual(self.summary(), summary)
+        with self.captureOnCommitCallbacks(execute=True):
+            leaderboard.rebuild()
+        self.assertEqual(self.summary(), summary)
+
+    def test_recent_saves_between_old_ones_are_kept(self):
+        # 407, saved now, sits between 9474 and 8208, which are folded by the same batch.
+        ArmstrongNumber.objects.create(user=self.user, number=8208, created_at=rollups.retention_cutoff(60))
+        self.roll_up()
+        self.assertEqual(list(ArmstrongNumber.objects.values_list("number", flat=True)), [407])
+        self.assertEqual(ArmstrongNumberRollup.objects.aggregate(total=Sum("count"))["total"], 6)
+
+    def test_listing_reads_rollups(self):
+        url = reverse("get_numbers_api")
+        etag = self.client.get(url)["ETag"]
+        self.roll_up()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([entry["number"] for entry in res.json()["armstrong_numbers"]], [407, 9474, 153, 370])
+
+        numbers, cursor = [], None
+        while True:
+            data = self.client.get(url, {"page_size": 1, **({"cursor": cursor} if cursor else {})}).json()
+            numbers += [entry["number"] for entry in data["armstrong_numbers"]]
+            if (cursor := data["next_cursor"]) is None:
+                break
+        self.assertEqual(numbers, [407, 9474, 153, 370])
+
+        global_entry = self.client.get(reverse("global_armstrong_numbers_api")).json()["users"][0]
+        self.assertEqual(global_entry["count"], 6)
+
+    def test_saves_imported_into_a_folded_day(self):
+        self.roll_up()
+        ArmstrongNumber.objects.create(
+            user=self.user, number=153, created_at=rollups.retention_cutoff(100) + timedelta(hours=5),
+        )
+        self.roll_up()
+        self.assertEqual(ArmstrongNumberRollup.objects.get(number=153).count, 4)
+        self.assertEqual(self.summary()[0], 7)
+
+    def test_archive(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "archive.csv")
+        self.roll_up(archive=path)
+        ArmstrongNumber.objects.create(user=self.user, number=8208, created_at=rollups.retention_cutoff(50))
+        self.roll_up(archive=path)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], "email,number,base,created_at")
+        self.assertEqual([line.split(",")[1] for line in lines[1:]], ["153", "153", "370", "153", "9474", "8208"])
+
+    def test_export_includes_rollups(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "numbers.ndjson")
+        self.roll_up()
+        rollup_fields = ("number", "day", "count", "first_saved_at", "last_saved_at")
+        folded = sorted(ArmstrongNumberRollup.objects.values_list(*rollup_fields))
+        call_command("export_numbers", output=path, chunk_size=2, stderr=StringIO())
+        with open(path) as f:
+            self.assertEqual(sorted(json.loads(line)["number"] for line in f), [153, 153, 153, 370, 407, 9474])
+
+        ArmstrongNumber.objects.all().delete()
+        ArmstrongNumberRollup.objects.all().delete()
+        call_command("import_numbers", path, stderr=StringIO())
+        self.roll_up()
+        self.assertEqual(sorted(ArmstrongNumberRollup.objects.values_list(*rollup_fields)), folded)
+        self.assertEqual(self.summary()[0], 6)
+
+    @override_settings(ARMSTRONG_UNIQUE_SAVES=True)
+    def test_nothing_to_roll_up_with_unique_saves(self):
+        with self.assertRaises(CommandError):
+            call_command("rollup_numbers", stderr=StringIO())
+
+
+class ImportExportTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="io@example.com", password="StrongPass123!")
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    def test_import_csv(self):
+        with open(self.path("numbers.csv"), "w") as f:
+            f.write(
+                "email,number,created_at\n"
+                "io@example.com,153,2024-01-02T03:04:05+00:00\n"
+                "io@example.com,154,2024-01-02T03:04:05+00:00\n"
+                "nobody@example.com,370,\n"
+                "io@example.com,9474,\n"
+            )
+        stderr = StringIO()
+        call_command("import_numbers", self.path("numbers.csv"), batch_size=2, stderr=stderr)
+
+        self.assertEqual(
+            sorted(ArmstrongNumber.objects.values_list("number", flat=True)), [153, 9474],
+        )
+        self.assertEqual(ArmstrongNumber.objects.get(number=153).created_at.year, 2024)
+        self.assertIn("Line 3: 154 is not an Armstrong number", stderr.getvalue())
+        self.assertIn("no user with email nobody@example.com", stderr.getvalue())
+        self.assertIn("Imported 2 numbers, skipped 2 rows", stderr.getvalue())
+        self.assertEqual(ArmstrongNumberSummary.objects.get(user=self.user).count, 2)
+
+    @override_settings(ARMSTRONG_UNIQUE_SAVES=True)
+    def test_import_counts_only_new_numbers_with_unique_saves(self):
+        # The test database is migrated with the setting off, so add the index here.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE UNIQUE INDEX armstrong_unique_per_user ON armstrong_numbers (user_id, number, base)"
+            )
+        ArmstrongNumber.objects.create(user=self.user, number=153)
+        with open(self.path("numbers.csv"), "w") as f:
+            f.write("email,number\nio@example.com,153\nio@example.com,370\nio@example.com,370\n")
+        stderr = StringIO()
+        call_command("import_numbers", self.path("numbers.csv"), stderr=stderr)
+
+        self.assertEqual(ArmstrongNumber.objects.count(), 2)
+        self.assertIn("Imported 1 numbers, skipped 0 rows, 2 already saved", stderr.getvalue())
+
+    def test_export_then_import_ndjson(self):
+        ArmstrongNumber.objects.create(user=self.user, number=407)
+        ArmstrongNumber.objects.create(user=self.user, number=0x156, base=16)
+        call_command("export_numbers", output=self.path("numbers.ndjson"), chunk_size=1, stderr=StringIO())
+
+        with open(self.path("numbers.ndjson")) as f:
+            exported = [json.loads(line) for line in f]
+        self.assertEqual([(row["number"], row["base"]) for row in exported], [(407, 10), (0x156, 16)])
+
+        ArmstrongNumber.objects.all().delete()
+        call_command("import_numbers", self.path("numbers.ndjson"), stderr=StringIO())
+        self.assertEqual(
+            sorted(ArmstrongNumber.objects.values_list("base", "number")), [(10, 407), (16, 0x156)],
+        )
+
+    def test_export_csv_to_stdout(self):
+        ArmstrongNumber.objects.create(user=self.user, number=153)
+        stdout = StringIO()
+        call_command("export_numbers", stdout=stdout, stderr=StringIO())
+        self.assertEqual(stdout.getvalue().splitlines()[0], "email,number,base,created_at")
+        self.assertTrue(stdout.getvalue().splitlines()[1].startswith("io@example.com,153,10,"))
+
+
+class SessionTests(TestCase):
+    def setUp(self):
+        caches["sessions"].clear()
+        self.user = CustomUser.objects.create_user(email="session@example.com", password="StrongPass123!")
+
+    def login(self):
+        self.client.post(reverse("login"), {"email": "session@example.com", "password": "StrongPass123!"})
+
+    def expire_access_token(self, client=None):
+        access = AccessToken.for_user(self.user)
+        access.set_exp(lifetime=-timedelta(minutes=1))
+        session = (client or self.client).session
+        session["access"] = str(access)
+        session.save()
+        return str(access)
+
+    def session_queries(self, queries):
+        return [query["sql"] for query in queries if "django_session" in query["sql"]]
+
+    def test_expired_access_token_is_refreshed(self):
+        self.login()
+        expired = self.expire_access_token()
+
+        res = self.client.get(reverse("verify_number"))
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(self.client.session["access"], expired)
+
+    def test_invalid_refresh_token_redirects_to_login(self):
+        self.login()
+        self.expire_access_token()
+        session = self.client.session
+        session["refresh"] = "not-a-token"
+        session.save()
+        self.assertRedirects(self.client.get(reverse("verify_number")), reverse("login"))
+
+    def test_cached_db_sessions_are_read_from_the_cache(self):
+        self.login()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse("verify_number")).status_code, 200)
+        self.assertEqual(self.session_queries(queries), [])
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies")
+    def test_signed_cookie_sessions(self):
+        self.login()
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(reverse("verify_number"), {"number": 370, "action": "save"})
+        self.assertEqual(res.context["user_numbers"]["armstrong_numbers"], [{"number": 370, "base": 10}])
+        self.assertEqual(self.session_queries(queries), [])
+
+    @override_settings(ROOT_URLCONF="user.async_urls")
+    async def test_async_page_refreshes_access_token(self):
+        await self.async_client.post(reverse("login"), {"email": "session@example.com", "password": "StrongPass123!"})
+        expired = await sync_to_async(self.expire_access_token)(self.async_client)
+        res = await self.async_client.get(reverse("verify_number"))
+        self.assertEqual(res.status_code, 200)
+        session = await sync_to_async(lambda: self.async_client.session)()
+        self.assertNotEqual(await session.aget("access"), expired)
+
+
+class GlobalPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="cached@example.com", password="StrongPass123!")
+        with self.captureOnCommitCallbacks(execute=True):
+            ArmstrongNumber.objects.create(user=self.user, number=153)
+
+    def test_user_blocks_are_cached_per_user_version(self):
+        self.client.get(reverse("global_page"))
+
+        # Change the summary behind the cache's back, keeping its version.
+        summary = ArmstrongNumberSummary.objects.filter(user=self.user)
+        summary.update(numbers=[{"number": 9474, "base": 10}], updated_at=summary.get().updated_at)
+        leaderboard.bump_global_version()
+        self.assertNotContains(self.client.get(reverse("global_page")), "9474")
+
+        summary.update(updated_at=timezone.now())
+        leaderboard.bump_global_version()
+        self.assertContains(self.client.get(reverse("global_page")), "9474")
+
+    @override_settings(ARMSTRONG_PAGE_CACHE=True)
+    def test_anonymous_page_cache_until_next_save(self):
+        self.assertTemplateUsed(self.client.get(reverse("global_page")), "user/global.html")
+        res = self.client.get(reverse("global_page"))
+        self.assertTemplateNotUsed(res, "user/global.html")
+        self.assertContains(res, "153")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ArmstrongNumber.objects.create(user=self.user, number=370)
+        self.assertContains(self.client.get(reverse("global_page")), "370")
+
+    @override_settings(ARMSTRONG_PAGE_CACHE=True)
+    def test_visitors_with_a_session_skip_the_page_cache(self):
+        self.client.get(reverse("global_page"))
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = "abc"
+        self.assertTemplateUsed(self.client.get(reverse("global_page")), "user/global.html")
+
+    @override_settings(ARMSTRONG_PAGE_CACHE=True, ROOT_URLCONF="user.async_urls")
+    async def test_async_page_cache(self):
+        await self.async_client.get(reverse("global_page"))
+        res = await self.async_client.get(reverse("global_page"))
+        self.assertTemplateNotUsed(res, "user/global.html")
+        self.assertContains(res, "cached@example.com")
+
+
+class WarmupTests(TestCase):
+    def test_warm_up_runs_every_step(self):
+        armstrong_table.cache_clear()
+        timings = warmup.warm_up()
+        self.assertEqual([name for name, _ in timings], [name for name, _ in warmup.STEPS])
+        self.assertEqual(armstrong_table.cache_info().currsize, MAX_BASE - MIN_BASE + 1)
+        self.assertIn("warmup", metrics.STARTUP)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("warmup", stdout=out)
+        self.assertIn("password_validators", out.getvalue())
+        self.assertIn("Warmed up in", out.getvalue())
+
+    def test_probes_do_not_write(self):
+        results = warmup.run_probes(WSGIHandler(), host="testserver")
+        self.assertEqual({name: status for name, (status, _) in results.items()}, {
+            "global_page": 200,
+            "register_api": 400,
+            "armstrong_numbers_range_api": 200,
+            "global_armstrong_numbers_api": 200,
+        })
+        self.assertFalse(CustomUser.objects.exists())
+
+    def test_startup_gauges(self):
+        self.client.get(reverse("global_armstrong_numbers_api"))
+        self.assertIn("armstrong_startup_first_request_seconds", self.client.get(reverse("metrics")).content.decode())
@@ -3,9 +3,12 @@ from .views import (
     RegisterAPIView, 
     LoginAPIView, 
     VerifyNumberAPIView, 
+    VerifyNumbersBatchAPIView,
+    ArmstrongRangeAPIView,
     GetGlobalArmstrongNumbersAPIView,
     global_page,
     login_page,
+    metrics_view,
     register_page,
     verify_number)
 
@@ -17,8 +20,11 @@ urlpatterns = [
     path("api/register/", RegisterAPIView.as_view(), name="register_api"),
     path("api/login/", LoginAPIView.as_view(), name="login_api"),
     path("api/verify-number/", VerifyNumberAPIView.as_view(), name="verify_number_api"),
+    path("api/verify-numbers/batch/", VerifyNumbersBatchAPIView.as_view(), name="verify_numbers_batch_api"),
     path("api/get-numbers/", VerifyNumberAPIView.as_view(), name="get_numbers_api"),
+    path("api/armstrong-numbers/range/", ArmstrongRangeAPIView.as_view(), name="armstrong_numbers_range_api"),
     path('api/global-armstrong-numbers/', GetGlobalArmstrongNumbersAPIView.as_view(), name="global_armstrong_numbers_api"),
+    path("metrics/", metrics_view, name="metrics"),
 
 
     # -------------------------------------------------------------------------------------------------------------------------
@@ -1,14 +1,21 @@
-import requests
+import ipaddress
 
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.conf import settings
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from .forms import LoginForm, NumberForm, RegistrationForm
 from django.contrib import messages
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
-from user.models import ArmstrongNumber, CustomUser
-from .serializers import RegistrationSerializer, LoginSerializer, ArmstrongSerializer, UserWithArmstrongNumbersSerializer
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework import serializers, status
+from . import leaderboard, metrics, services
+from .armstrong import armstrong_numbers_between
+from .renderers import ndjson_lines
+from .write_behind import SaveBufferFull
+from .serializers import ArmstrongRangeSerializer, CursorPaginationSerializer, UserNumbersQuerySerializer
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
 
@@ -16,104 +23,100 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 # -------------------------------------------------------------------------------------------------------------------------
 # API Views
 # -------------------------------------------------------------------------------------------------------------------------
+def _timestamp(value):
+    # HTTP dates have one-second resolution.
+    return int(value.timestamp()) if value else None
+
+
+def _with_validators(response, etag, last_modified=None):
+    """Set the ETag and Last-Modified headers clients send back on their next request."""
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(_timestamp(last_modified))
+    return response
+
+
 class RegisterAPIView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
-        serializer = RegistrationSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(
-                {"message": "Registration successful. You can now log in with your credentials."},
-                status=status.HTTP_201_CREATED,
-            )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
+        try:
+            services.register(request.data)
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {"message": "Registration successful. You can now log in with your credentials."},
+            status=status.HTTP_201_CREATED,
+        )
+
 
 
 class LoginAPIView(APIView):
     permission_classes = []
 
     def post(self, request, *args, **kwargs):
-        serializer = LoginSerializer(data=request.data, context={"request": request})
-        serializer.is_valid(raise_exception=True)
+        # Generate JWT tokens
+        tokens = services.login(request.data, request=request)
+        return Response(tokens, status=status.HTTP_200_OK)
 
-        user = serializer.validated_data["user"]
 
-        # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
 
-        return Response(
-            {
-                "refresh": str(refresh),
-                "access": str(refresh.access_token),
-                "user": {
-                    "id": user.id,
-                    "email": user.email,
+class VerifyNumberAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            response_data = services.verify_number(request.user, request.data)
+        except serializers.ValidationError as e:
+            return Response(
+                {
+                    "is_armstrong": False,
+                    "errors": e.detail,
                 },
-            },
-            status=status.HTTP_200_OK,
-        )
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(response_data, status=status.HTTP_200_OK)
 
+    def get(self, request, *args, **kwargs):
+        """Retrieve a page of the Armstrong numbers saved by the authenticated user."""
+        serializer = UserNumbersQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
+        etag, last_modified = services.user_numbers_validators(request.user)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=_timestamp(last_modified))
+        if not_modified is not None:
+            return not_modified
 
-def is_armstrong(num: int) -> bool:
-    """Check if a number is an Armstrong number."""
-    digits = str(num)
-    power = len(digits)
-    return sum(int(d) ** power for d in digits) == num
+        response = Response(services.user_numbers(request.user, **serializer.validated_data), status=status.HTTP_200_OK)
+        return _with_validators(response, etag, last_modified)
 
 
-class VerifyNumberAPIView(APIView):
+class VerifyNumbersBatchAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        serializer = ArmstrongSerializer(data=request.data)
-        if serializer.is_valid():
-            number = serializer.validated_data["number"]
-            armstrong = is_armstrong(number)
-
-            response_data = {
-                "number": number,
-                "is_armstrong": armstrong,
-            }
-
-            if armstrong:
-                response_data["message"] = f"{number} is an Armstrong number ✅"
-
-                # Save only if requested
-                if request.data.get("save"):
-                    ArmstrongNumber.objects.create(user=request.user, number=number)
-                    response_data["saved"] = True
-                    response_data["message"] += " (saved)"
-                else:
-                    response_data["saved"] = False
-            else:
-                response_data["message"] = f"{number} is not an Armstrong number ❌"
-                response_data["saved"] = False
+        """Verify many numbers in one request and bulk-save the Armstrong ones if requested."""
+        try:
+            response_data = services.verify_numbers(request.user, request.data)
+        except serializers.ValidationError as e:
+            return Response({"errors": e.detail}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(response_data, status=status.HTTP_200_OK)
 
-            return Response(response_data, status=status.HTTP_200_OK)
 
-        return Response(
-            {
-                "is_armstrong": False,
-                "errors": serializer.errors,
-            },
-            status=status.HTTP_400_BAD_REQUEST,
-        )
+class ArmstrongRangeAPIView(APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []
 
     def get(self, request, *args, **kwargs):
-        """Retrieve all Armstrong numbers saved by the authenticated user."""
-        user_numbers = ArmstrongNumber.objects.filter(user=request.user).values_list("number", flat=True)
+        """Stream every Armstrong number in [lo, hi] as NDJSON."""
+        serializer = ArmstrongRangeSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(
-            {
-                "user": request.user.email,
-                "armstrong_numbers": list(user_numbers),
-                "count": user_numbers.count(),
-            },
-            status=status.HTTP_200_OK,
-        )
+        numbers = armstrong_numbers_between(serializer.validated_data["lo"], serializer.validated_data["hi"])
+        lines = ndjson_lines({"number": number} for number in numbers)
+        return StreamingHttpResponse(lines, content_type="application/x-ndjson")
 
 
 class GetGlobalArmstrongNumbersAPIView(APIView):
@@ -121,37 +124,64 @@ class GetGlobalArmstrongNumbersAPIView(APIView):
     authentication_classes = []
 
     def get(self, request, *args, **kwargs):
-        users = CustomUser.objects.prefetch_related('armstrong_numbers').all()
-        serializer = UserWithArmstrongNumbersSerializer(users, many=True)
-        return Response({
-            "total_users": users.count(),
-            "users": serializer.data
-        }, status=200)
-    
+        serializer = CursorPaginationSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        params = serializer.validated_data
+
+        if params["stream"]:
+            users = services.iter_global_numbers(chunk_size=params.get("page_size"))
+            return StreamingHttpResponse(ndjson_lines(users), content_type="application/x-ndjson")
+
+        etag = leaderboard.global_etag()
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        data = services.global_numbers(cursor=params.get("cursor"), page_size=params.get("page_size"))
+        return _with_validators(Response(data, status=200), etag)
+
+
+def metrics_view(request):
+    """Serve the request metrics in Prometheus text format, to ``ARMSTRONG_METRICS_ALLOWED_IPS`` only."""
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.exposition(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _metrics_allowed(request):
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in settings.ARMSTRONG_METRICS_ALLOWED_IPS)
+
 
 # -------------------------------------------------------------------------------------------------------------------------
 # Normal Views
 # -------------------------------------------------------------------------------------------------------------------------
 
-API_REGISTER_URL = "http://127.0.0.1:8000/api/register/"
+def _error_messages(request, errors):
+    """Show serializer errors as flash messages."""
+    for field, msgs in errors.items():
+        for msg in msgs:
+            if field in ("non_field_errors", "detail"):
+                messages.error(request, msg)
+            else:
+                messages.error(request, f"{field.capitalize()}: {msg}")
+
 
 def register_page(request):
     if request.method == "POST":
         form = RegistrationForm(request.POST)
         if form.is_valid():
-            data = form.cleaned_data
-            res = requests.post(API_REGISTER_URL, json=data)
-            if res.status_code == 201:
+            try:
+                services.register(form.cleaned_data)
+            except serializers.ValidationError as e:
+                _error_messages(request, e.detail)
+            else:
                 messages.success(request, "✅ Registration successful! Now you can login with your credentials.")
                 return redirect("login")
-            else:
-                errors = res.json()
-                for field, msgs in errors.items():
-                    for msg in msgs:
-                        if field == "non_field_errors":
-                            messages.error(request, msg)
-                        else:
-                            messages.error(request, f"{field.capitalize()}: {msg}")
     else:
         form = RegistrationForm()
     return render(request, "user/register.html", {"form": form})
@@ -159,27 +189,19 @@ def register_page(request):
 
 
 
-API_LOGIN_URL = "http://127.0.0.1:8000/api/login/"
-
 def login_page(request):
     if request.method == "POST":
         form = LoginForm(request.POST)
         if form.is_valid():
-            res = requests.post(API_LOGIN_URL, json=form.cleaned_data)
-            if res.status_code == 200:
-                tokens = res.json()
+            try:
+                tokens = services.login(form.cleaned_data, request=request)
+            except serializers.ValidationError as e:
+                _error_messages(request, e.detail)
+            else:
                 request.session["access"] = tokens["access"]
                 request.session["refresh"] = tokens["refresh"]
                 messages.success(request, "✅ Login successful!")
                 return redirect("verify_number")
-            else:
-                errors = res.json()
-                for field, msgs in errors.items():
-                    for msg in msgs:
-                        if field == "non_field_errors":
-                            messages.error(request, msg)
-                        else:
-                            messages.error(request, f"{field.capitalize()}: {msg}")
     else:
         form = LoginForm()
     return render(request, "user/login.html", {"form": form})
@@ -187,19 +209,29 @@ def login_page(request):
 
 
 
-API_VERIFY_URL = "http://127.0.0.1:8000/api/verify-number/"
+def _session_user(request):
+    """Return the user whose tokens are in the session, refreshing an expired access token."""
+    access = request.session.get("access")
+    user = services.user_for_access_token(access) if access else None
+    refresh = request.session.get("refresh")
+    if user is None and refresh:
+        access = services.refresh_access_token(refresh)
+        if access:
+            request.session["access"] = access
+            user = services.user_for_access_token(access)
+    return user
+
 
 def verify_number(request):
-    access = request.session.get("access")
-    if not access:
+    user = _session_user(request)
+    if user is None:
         messages.error(request, "⚠️ Please login first")
-        return redirect("login_page")
+        return redirect("login")
 
     result = None
     form = NumberForm(request.POST or None)
 
     if request.method == "POST" and form.is_valid():
-        headers = {"Authorization": f"Bearer {access}"}
         action = request.POST.get("action")  # detect which button was clicked
 
         payload = form.cleaned_data
@@ -207,27 +239,19 @@ def verify_number(request):
             payload["save"] = True
 
         try:
-            res = requests.post(API_VERIFY_URL, json=payload, headers=headers, timeout=5)
-            if res.status_code == 200:
-                result = res.json()
-                if result.get("saved"):
-                    messages.success(request, "✅ Number verified and saved!")
-                else:
-                    messages.info(request, "ℹ️ Number verified (not saved).")
+            result = services.verify_number(user, payload)
+        except serializers.ValidationError:
+            result = {"message": "❌ Number is not an Armstrong number"}
+        except SaveBufferFull as e:
+            result = {"message": f"⚠️ {e.detail}"}
+        else:
+            if result.get("saved"):
+                messages.success(request, "✅ Number verified and saved!")
             else:
-                result = {"message": "❌ Number is not an Armstrong number"}
-        except requests.RequestException as e:
-            result = {"message": f"⚠️ API connection error: {str(e)}"}
+                messages.info(request, "ℹ️ Number verified (not saved).")
 
     # Fetch user’s saved numbers
-    user_numbers = {"armstrong_numbers": []}
-    headers = {"Authorization": f"Bearer {access}"}
-    try:
-        res = requests.get(API_VERIFY_URL, headers=headers, timeout=5)
-        if res.status_code == 200:
-            user_numbers = res.json()
-    except requests.RequestException as e:
-        messages.error(request, f"⚠️ API connection error: {str(e)}")
+    user_numbers = services.user_numbers(user)
 
     return render(
         request,
@@ -239,9 +263,31 @@ def verify_number(request):
 
 
 
-API_GLOBAL_URL = "http://127.0.0.1:8000/api/global-armstrong-numbers/"
+def _anonymous(request):
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def _global_context(data):
+    return {"data": data, "fragment_timeout": settings.ARMSTRONG_GLOBAL_CACHE_TIMEOUT}
+
 
 def global_page(request):
-    res = requests.get(API_GLOBAL_URL)
-    data = res.json() if res.status_code == 200 else {}
-    return render(request, "user/global.html", {"data": data})
+    etag = leaderboard.global_etag()
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    serializer = CursorPaginationSerializer(data=request.GET)
+    cursor = serializer.validated_data.get("cursor") if serializer.is_valid() else None
+
+    def build():
+        data = services.global_numbers(cursor=cursor)
+        return render_to_string("user/global.html", _global_context(data), request)
+
+    # The page has nothing specific to the visitor, but visitors with a session
+    # may have flash messages waiting, so only anonymous hits share the cache.
+    if settings.ARMSTRONG_PAGE_CACHE and _anonymous(request):
+        html = leaderboard.cached_global(f"html:{cursor}", build)
+    else:
+        html = build()
+    return _with_validators(HttpResponse(html), etag)
@@ -0,0 +1,174 @@
+"""
+Warming a worker up before it serves traffic.
+
+Several things are built on first use and make the first requests to a new
+worker slow: the URL resolver (which imports the views), the password
+validators (``CommonPasswordValidator`` decompresses its list of 20,000
+passwords), the password hashers and JWT backend, the compiled templates and
+crispy form layouts, and the bundled Armstrong tables of bases other than 10.
+``warm_up`` builds them ahead of time. The WSGI and ASGI entry points call
+``application_loaded``, which runs it when ``ARMSTRONG_WARMUP`` is on, and
+``manage.py warmup`` runs it by hand or measures a cold start.
+
+Setup, warmup and first-request times are exported by ``/metrics/`` as
+``armstrong_startup_*_seconds`` gauges.
+
+This module is imported before the app registry is ready (by the
+cold-start probe), so it imports the app's modules lazily.
+"""
+import json
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from user import metrics
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / "templates" / "user"
+
+# Requests timed by ``manage.py warmup --cold-start``: (name, method, path, data).
+# None of them writes: the registration is rejected for its common password.
+PROBES = (
+    ("global_page", "get", "/", None),
+    ("register_api", "post", "/api/register/",
+     {"email": "warmup@example.invalid", "password1": "password", "password2": "password"}),
+    ("armstrong_numbers_range_api", "get", "/api/armstrong-numbers/range/", {"lo": 0, "hi": 10 ** 9}),
+    ("global_armstrong_numbers_api", "get", "/api/global-armstrong-numbers/", None),
+)
+
+
+def _urls():
+    from django.urls import Resolver404, get_resolver
+
+    resolver = get_resolver()
+    # Compiles every pattern and builds the reverse lookup tables.
+    resolver.reverse_dict
+    try:
+        resolver.resolve("/")
+    except Resolver404:
+        pass
+
+
+def _password_validators():
+    from django.contrib.auth.password_validation import get_default_password_validators
+
+    get_default_password_validators()
+
+
+def _auth():
+    from django.contrib.auth.hashers import get_hashers
+    from rest_framework_simplejwt.state import token_backend
+
+    get_hashers()
+    token_backend.decode(token_backend.encode({"token_type": "access"}), verify=False)
+
+
+def _templates():
+    from crispy_forms.templatetags.crispy_forms_filters import as_crispy_form
+    from django.template.loader import get_template
+
+    from user.forms import LoginForm, NumberForm, RegistrationForm
+
+    for path in sorted(TEMPLATE_DIR.glob("*.html")):
+        get_template(f"user/{path.name}")
+    # The pages render their forms with the ``crispy`` filter.
+    for form_class in (LoginForm, NumberForm, RegistrationForm):
+        as_crispy_form(form_class())
+
+
+def _serializers():
+    from django.core.validators import validate_email
+
+    from user.properties import PROPERTIES
+    from user.serializers import ArmstrongSerializer
+
+    # Its domain pattern is compiled on first use, which takes longer than the
+    # rest of a registration.
+    validate_email("warmup@example.com")
+    ArmstrongSerializer(data={"number": 153, "properties": list(PROPERTIES)}).is_valid()
+
+
+def _armstrong_tables():
+    from user.armstrong import MAX_BASE, MIN_BASE, armstrong_table
+
+    # Loaded from the bundled tables, unless TABLE_SEARCH_BUDGET changed.
+    for base in range(MIN_BASE, MAX_BASE + 1):
+        armstrong_table(base)
+
+
+STEPS = (
+    ("urls", _urls),
+    ("password_validators", _password_validators),
+    ("auth", _auth),
+    ("templates", _templates),
+    ("serializers", _serializers),
+    ("armstrong_tables", _armstrong_tables),
+)
+
+
+def warm_up():
+    """Run every warmup step; returns ``(step, seconds)`` pairs."""
+    timings = []
+    for name, step in STEPS:
+        started = time.perf_counter()
+        step()
+        timings.append((name, time.perf_counter() - started))
+    metrics.set_startup("warmup", sum(seconds for _, seconds in timings))
+    return timings
+
+
+def application_loaded(setup_seconds):
+    """Called by the WSGI and ASGI entry points once Django is set up."""
+    metrics.set_startup("setup", setup_seconds)
+    if settings.ARMSTRONG_WARMUP:
+        timings = warm_up()
+        logger.info(
+            "Set up in %.0f ms, warmed up in %.0f ms (%s)",
+            setup_seconds * 1000,
+            sum(seconds for _, seconds in timings) * 1000,
+            ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings),
+        )
+
+
+def run_probes(handler, host=None):
+    """Send each of ``PROBES`` to a WSGI ``handler``; returns ``{name: (status, seconds)}``."""
+    from django.test import RequestFactory
+
+    factory = RequestFactory(HTTP_HOST=host or "localhost")
+    results = {}
+    for name, method, path, data in PROBES:
+        if method == "post":
+            request = factory.post(path, json.dumps(data), content_type="application/json")
+        else:
+            request = factory.get(path, data)
+        started = time.perf_counter()
+        response = handler(request.environ, lambda status, headers, exc_info=None: None)
+        for _ in response:
+            pass
+        response.close()
+        results[name] = (response.status_code, time.perf_counter() - started)
+    return results
+
+
+def cold_start_probe(started, warm):
+    """Measure this (fresh) process: print setup and warmup times and the latency of
+    the first and second round of ``PROBES`` as JSON.
+
+    ``started`` is the ``time.perf_counter()`` taken before Django was imported.
+    """
+    import django
+    from django.core.handlers.wsgi import WSGIHandler
+
+    django.setup(set_prefix=False)
+    handler = WSGIHandler()
+    report = {"setup": time.perf_counter() - started}
+    if warm:
+        report["warmup"] = sum(seconds for _, seconds in warm_up())
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != "*" and not host.startswith(".")]
+    host = hosts[0] if hosts else None
+    report["first"] = run_probes(handler, host)
+    report["second"] = run_probes(handler, host)
+    print(json.dumps(report))
@@ -0,0 +1,202 @@
+"""
+Opt-in write-behind buffer for saved Armstrong numbers.
+
+With ``ARMSTRONG_WRITE_BEHIND`` on, save requests put their rows on an
+in-process bounded queue and return. A background thread writes the queue
+with one ``bulk_create`` every ``ARMSTRONG_WRITE_BEHIND_BATCH_SIZE`` rows or
+``ARMSTRONG_WRITE_BEHIND_FLUSH_MS`` milliseconds, whichever comes first, and
+whatever is left is flushed when the process exits. Saves therefore show up in
+listings a few milliseconds late. A batch whose write fails (the database is
+down, say) is retried with a growing delay, up to
+``ARMSTRONG_WRITE_BEHIND_MAX_RETRIES`` times, and then dropped and logged;
+meanwhile the queue fills up and new saves get 503s.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+# Longest wait, in seconds, between two attempts at writing a batch.
+MAX_RETRY_DELAY = 30
+
+
+class SaveBufferFull(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many saves are pending, please try again shortly."
+    default_code = "save_buffer_full"
+
+
+class SaveBuffer:
+    def __init__(
+        self, max_queue=None, batch_size=None, flush_ms=None, put_timeout=None, max_retries=None, autostart=True,
+    ):
+        self.max_queue = max_queue or settings.ARMSTRONG_WRITE_BEHIND_MAX_QUEUE
+        self.batch_size = batch_size or settings.ARMSTRONG_WRITE_BEHIND_BATCH_SIZE
+        self.flush_interval = (flush_ms or settings.ARMSTRONG_WRITE_BEHIND_FLUSH_MS) / 1000
+        self.put_timeout = settings.ARMSTRONG_WRITE_BEHIND_PUT_TIMEOUT if put_timeout is None else put_timeout
+        self.max_retries = settings.ARMSTRONG_WRITE_BEHIND_MAX_RETRIES if max_retries is None else max_retries
+        self.autostart = autostart
+
+        # Rows waiting to be written, guarded by the condition, which is
+        # notified whenever rows are added or taken.
+        self._rows = deque()
+        self._changed = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.rejected_rows = 0
+        self.failed_writes = 0
+        self.dropped_rows = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    def put(self, rows):
+        """Queue unsaved ``ArmstrongNumber`` rows, waiting up to ``put_timeout`` for room.
+
+        Raises ``SaveBufferFull`` when the queue stays too full for all of
+        ``rows``, so callers see backpressure instead of the queue growing
+        without bound. Either every row is queued or none is, so a rejected
+        request can be retried without saving anything twice.
+        """
+        if self.autostart:
+            self.start()
+        rows = list(rows)
+        with self._changed:
+            has_room = len(rows) <= self.max_queue and self._changed.wait_for(
+                lambda: len(self._rows) + len(rows) <= self.max_queue, timeout=self.put_timeout,
+            )
+            if not has_room:
+                self.rejected_rows += len(rows)
+                raise SaveBufferFull()
+            self._rows.extend(rows)
+            self._changed.notify_all()
+
+    def start(self):
+        """Start the background flusher once per process."""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="armstrong-save-buffer", daemon=True)
+                self._thread.start()
+                atexit.register(self.shutdown)
+
+    def flush(self):
+        """Write everything queued so far, from the calling thread."""
+        while self._rows:
+            self._write(self._take(block=False))
+
+    def shutdown(self):
+        """Stop the flusher after its current batch, then write what is left."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def stats(self):
+        return {
+            "queue_depth": len(self._rows),
+            "max_queue": self.max_queue,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "rejected_rows": self.rejected_rows,
+            "failed_writes": self.failed_writes,
+            "dropped_rows": self.dropped_rows,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+        }
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._write_with_retries(self._take(block=True))
+
+    def _write_with_retries(self, rows):
+        """Write ``rows``, retrying failed writes up to ``max_retries`` times before dropping them."""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # On shutdown, hand the batch back for shutdown()'s last flush.
+                if self._stopped.wait(min(self.flush_interval * 2 ** attempt, MAX_RETRY_DELAY)):
+                    self._requeue(rows)
+                    return
+            try:
+                # This thread outlives requests, so apply CONN_MAX_AGE here.
+                close_old_connections()
+                self._write(rows)
+                return
+            except Exception:
+                self.failed_writes += 1
+                logger.exception(
+                    "Failed to write %d buffered Armstrong numbers (attempt %d of %d)",
+                    len(rows), attempt + 1, self.max_retries + 1,
+                )
+        self.dropped_rows += len(rows)
+        logger.error(
+            "Dropped %d buffered Armstrong numbers (user id, number, base): %s",
+            len(rows), [(row.user_id, row.number, row.base) for row in rows],
+        )
+
+    def _requeue(self, rows):
+        with self._changed:
+            self._rows.extendleft(reversed(rows))
+            self._changed.notify_all()
+
+    def _take(self, block):
+        """Collect up to ``batch_size`` rows, waiting at most ``flush_interval`` after the first."""
+        with self._changed:
+            # Wake up regularly so that shutdown() is noticed.
+            if block and not self._changed.wait_for(lambda: self._rows, timeout=self.flush_interval):
+                return []
+            deadline = time.monotonic() + self.flush_interval
+            while block and len(self._rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._changed.wait(remaining):
+                    break
+            rows = [self._rows.popleft() for _ in range(min(self.batch_size, len(self._rows)))]
+            self._changed.notify_all()
+        return rows
+
+    def _write(self, rows):
+        if not rows:
+            return
+        from user.services import write_numbers
+
+        with self._write_lock:
+            started = time.perf_counter()
+            # All or nothing, so that a failed write can be retried.
+            with transaction.atomic():
+                write_numbers(rows)
+            elapsed = time.perf_counter() - started
+
+            self.flushes += 1
+            self.flushed_rows += len(rows)
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        logger.info(
+            "Flushed %d Armstrong numbers in %.1f ms (%d still queued)",
+            len(rows), elapsed * 1000, len(self._rows),
+        )
+
+
+_save_buffer = None
+_save_buffer_lock = threading.Lock()
+
+
+def get_save_buffer(create=True):
+    """Return this process's save buffer, creating it on first use unless ``create`` is False."""
+    global _save_buffer
+    with _save_buffer_lock:
+        if _save_buffer is None and create:
+            _save_buffer = SaveBuffer()
+        return _save_buffer